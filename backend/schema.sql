@@ -6,7 +6,8 @@ CREATE TABLE public.comments (
     has_parent boolean,
     content text NOT NULL,
     created_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP,
-    is_edited boolean DEFAULT false
+    is_edited boolean DEFAULT false,
+    search_vector tsvector GENERATED ALWAYS AS (to_tsvector('english'::regconfig, content)) STORED
 );
 
 
@@ -16,9 +17,14 @@ CREATE TABLE public.posts (
     subthread_id integer NOT NULL,
     title text NOT NULL,
     media text,
+    media_state text,
     content text,
     created_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP,
-    is_edited boolean DEFAULT false
+    is_edited boolean DEFAULT false,
+    search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english'::regconfig, title), 'A')
+        || setweight(to_tsvector('english'::regconfig, COALESCE(content, '')), 'B')
+    ) STORED
 );
 
 
@@ -43,11 +49,81 @@ CREATE TABLE public.users (
 );
 
 
+CREATE TABLE public.post_stats (
+    post_id integer NOT NULL,
+    user_id integer,
+    subthread_id integer,
+    created_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    karma integer DEFAULT 0 NOT NULL,
+    comments_count integer DEFAULT 0 NOT NULL,
+    hot_score double precision DEFAULT 0 NOT NULL,
+    revision bigint DEFAULT 0 NOT NULL,
+    updated_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+
+CREATE TABLE public.post_window_lengths (
+    duration text NOT NULL,
+    length interval NOT NULL
+);
+
+
+CREATE TABLE public.post_windows (
+    post_id integer NOT NULL,
+    duration text NOT NULL,
+    subthread_id integer,
+    created_at timestamp with time zone NOT NULL,
+    karma integer DEFAULT 0 NOT NULL
+);
+
+
+-- reaction triggers append here; flush_karma_deltas() folds them into the stats tables in batches
+CREATE TABLE public.karma_deltas (
+    post_id integer,
+    comment_id integer,
+    delta integer NOT NULL
+);
+
+-- bumped once per statement for every user whose reactions changed; part of that user's ETags
+CREATE TABLE public.reaction_revisions (
+    user_id integer NOT NULL,
+    revision bigint DEFAULT 0 NOT NULL
+);
+
+CREATE TABLE public.comment_stats (
+    comment_id integer NOT NULL,
+    user_id integer,
+    post_id integer,
+    karma integer DEFAULT 0 NOT NULL
+);
+
+
+CREATE TABLE public.user_stats (
+    user_id integer NOT NULL,
+    posts_count integer DEFAULT 0 NOT NULL,
+    posts_karma integer DEFAULT 0 NOT NULL,
+    comments_count integer DEFAULT 0 NOT NULL,
+    comments_karma integer DEFAULT 0 NOT NULL,
+    revision bigint DEFAULT 0 NOT NULL,
+    updated_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+
+CREATE TABLE public.subthread_stats (
+    subthread_id integer NOT NULL,
+    members_count integer DEFAULT 0 NOT NULL,
+    posts_count integer DEFAULT 0 NOT NULL,
+    comments_count integer DEFAULT 0 NOT NULL,
+    revision bigint DEFAULT 0 NOT NULL,
+    updated_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+
 CREATE VIEW public.comment_info AS
  SELECT c.id AS comment_id,
     u.username AS user_name,
     u.avatar AS user_avatar,
-    ckarma.comment_karma,
+    s.karma AS comment_karma,
     c.has_parent,
     c.parent_id,
     c.is_edited,
@@ -55,19 +131,9 @@ CREATE VIEW public.comment_info AS
     c.created_at,
     p.id AS post_id
    FROM (((public.posts p
-     FULL JOIN public.comments c ON ((c.post_id = p.id)))
-     FULL JOIN ( SELECT c_1.id AS comment_id,
-            COALESCE(sum(
-                CASE
-                    WHEN (r.is_upvote = true) THEN 1
-                    WHEN (r.is_upvote = false) THEN '-1'::integer
-                    ELSE 0
-                END), (0)::bigint) AS comment_karma
-           FROM (public.comments c_1
-             FULL JOIN public.reactions r ON ((r.comment_id = c_1.id)))
-          GROUP BY c_1.id
-         HAVING (c_1.id IS NOT NULL)) ckarma ON ((ckarma.comment_id = c.id)))
-     FULL JOIN public.users u ON ((u.id = c.user_id)));
+     LEFT JOIN public.comments c ON ((c.post_id = p.id)))
+     LEFT JOIN public.comment_stats s ON ((s.comment_id = c.id)))
+     LEFT JOIN public.users u ON ((u.id = c.user_id)));
 
 CREATE SEQUENCE public.comments_id_seq
     AS integer
@@ -89,6 +155,59 @@ CREATE TABLE public.messages (
     seen_at timestamp with time zone
 );
 
+-- one row per participant: the latest message and how many of the contact's messages are still unseen
+CREATE TABLE public.conversations (
+    user_id integer NOT NULL,
+    contact_id integer NOT NULL,
+    last_message_id integer NOT NULL,
+    unread_count integer DEFAULT 0 NOT NULL
+);
+
+CREATE TABLE public.notifications (
+    id bigint NOT NULL,
+    user_id integer NOT NULL,
+    kind text NOT NULL,
+    actor_id integer,
+    post_id integer,
+    comment_id integer,
+    seen boolean DEFAULT false NOT NULL,
+    created_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+CREATE SEQUENCE public.notifications_id_seq
+    AS bigint
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+ALTER SEQUENCE public.notifications_id_seq OWNED BY public.notifications.id;
+
+-- what the unread badges poll, kept in step by notify_users() and the messages triggers
+CREATE TABLE public.notification_counters (
+    user_id integer NOT NULL,
+    unread_notifications integer DEFAULT 0 NOT NULL,
+    unread_messages integer DEFAULT 0 NOT NULL
+);
+
+CREATE SEQUENCE public.event_ids
+    AS bigint
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+-- the last EVENTS_REPLAY_SIZE events per channel, replayed to clients reconnecting with Last-Event-ID
+CREATE TABLE public.events (
+    id bigint DEFAULT nextval('public.event_ids'::regclass) NOT NULL,
+    channel text NOT NULL,
+    event text NOT NULL,
+    data text NOT NULL,
+    created_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
 CREATE SEQUENCE public.messages_id_seq
     AS integer
     START WITH 1
@@ -105,42 +224,63 @@ CREATE TABLE public.subthreads (
     description text,
     created_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP,
     logo text,
-    created_by integer
+    created_by integer,
+    search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple'::regconfig, replace((name)::text, '/', ' ')), 'A')
+        || setweight(to_tsvector('simple'::regconfig, COALESCE(description, '')), 'B')
+    ) STORED
 );
 
 CREATE VIEW public.post_info AS
  SELECT t.id AS thread_id,
     t.name AS thread_name,
     t.logo AS thread_logo,
-    p.id AS post_id,
-    k.karma AS post_karma,
+    s.post_id,
+    s.karma AS post_karma,
     p.title,
     p.media,
+    p.media_state,
     p.is_edited,
     p.content,
-    p.created_at,
+    s.created_at,
     u.id AS user_id,
     u.username AS user_name,
     u.avatar AS user_avatar,
-    c.comments_count
-   FROM ((((public.posts p
-     JOIN ( SELECT p_1.id AS post_id,
-            COALESCE(sum(
-                CASE
-                    WHEN (r.is_upvote = true) THEN 1
-                    WHEN (r.is_upvote = false) THEN '-1'::integer
-                    ELSE 0
-                END), (0)::bigint) AS karma
-           FROM (public.posts p_1
-             FULL JOIN public.reactions r ON ((r.post_id = p_1.id)))
-          GROUP BY p_1.id) k ON ((k.post_id = p.id)))
-     JOIN ( SELECT p_1.id AS post_id,
-            count(c_1.id) AS comments_count
-           FROM (public.posts p_1
-             FULL JOIN public.comments c_1 ON ((c_1.post_id = p_1.id)))
-          GROUP BY p_1.id) c ON ((c.post_id = p.id)))
-     JOIN public.subthreads t ON ((t.id = p.subthread_id)))
-     JOIN public.users u ON ((u.id = p.user_id)));
+    s.comments_count,
+    s.hot_score
+   FROM (((public.post_stats s
+     JOIN public.posts p ON ((p.id = s.post_id)))
+     JOIN public.subthreads t ON ((t.id = s.subthread_id)))
+     JOIN public.users u ON ((u.id = s.user_id)));
+
+CREATE TABLE public.media_jobs (
+    id integer NOT NULL,
+    kind text NOT NULL,
+    target text,
+    target_id integer,
+    path text,
+    public_id text,
+    resource_type text,
+    transformation text,
+    content_type text,
+    url text,
+    status text DEFAULT 'pending'::text NOT NULL,
+    attempts integer DEFAULT 0 NOT NULL,
+    last_error text,
+    run_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    locked_at timestamp with time zone,
+    created_at timestamp with time zone DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+CREATE SEQUENCE public.media_jobs_id_seq
+    AS integer
+    START WITH 1
+    INCREMENT BY 1
+    NO MINVALUE
+    NO MAXVALUE
+    CACHE 1;
+
+ALTER SEQUENCE public.media_jobs_id_seq OWNED BY public.media_jobs.id;
 
 CREATE SEQUENCE public.posts_id_seq
     AS integer
@@ -216,26 +356,11 @@ CREATE VIEW public.subthread_info AS
  SELECT subthreads.id,
     subthreads.name,
     subthreads.logo,
-    mcount.members_count,
-    pcount.posts_count,
-    ccount.comments_count
-   FROM (((public.subthreads
-     FULL JOIN ( SELECT subthreads_1.id AS subthread_id,
-            count(*) AS members_count
-           FROM (public.subthreads subthreads_1
-             JOIN public.subscriptions ON ((subscriptions.subthread_id = subthreads_1.id)))
-          GROUP BY subthreads_1.id) mcount ON ((mcount.subthread_id = subthreads.id)))
-     FULL JOIN ( SELECT subthreads_1.id AS subthread_id,
-            count(*) AS posts_count
-           FROM (public.subthreads subthreads_1
-             JOIN public.posts ON ((posts.subthread_id = subthreads_1.id)))
-          GROUP BY subthreads_1.id) pcount ON ((pcount.subthread_id = subthreads.id)))
-     FULL JOIN ( SELECT subthreads_1.id AS subthread_id,
-            count(*) AS comments_count
-           FROM ((public.subthreads subthreads_1
-             JOIN public.posts ON ((posts.subthread_id = subthreads_1.id)))
-             JOIN public.comments ON ((comments.post_id = posts.id)))
-          GROUP BY subthreads_1.id) ccount ON ((ccount.subthread_id = subthreads.id)));
+    NULLIF(s.members_count, 0) AS members_count,
+    NULLIF(s.posts_count, 0) AS posts_count,
+    NULLIF(s.comments_count, 0) AS comments_count
+   FROM (public.subthreads
+     LEFT JOIN public.subthread_stats s ON ((s.subthread_id = subthreads.id)));
 
 CREATE SEQUENCE public.subthreads_id_seq
     AS integer
@@ -249,36 +374,13 @@ ALTER SEQUENCE public.subthreads_id_seq OWNED BY public.subthreads.id;
 
 CREATE VIEW public.user_info AS
  SELECT u.id AS user_id,
-    (c.karma + p.karma) AS user_karma,
-    c.comments_count,
-    c.karma AS comments_karma,
-    p.posts_count,
-    p.karma AS posts_karma
-   FROM ((public.users u
-     JOIN ( SELECT u_1.id AS user_id,
-            count(c_1.id) AS comments_count,
-            COALESCE(sum(
-                CASE
-                    WHEN ((r.is_upvote = true) AND (r.comment_id IS NOT NULL)) THEN 1
-                    WHEN ((r.is_upvote = false) AND (r.comment_id IS NOT NULL)) THEN '-1'::integer
-                    ELSE 0
-                END), (0)::bigint) AS karma
-           FROM ((public.users u_1
-             FULL JOIN public.comments c_1 ON ((c_1.user_id = u_1.id)))
-             FULL JOIN public.reactions r ON ((r.comment_id = c_1.id)))
-          GROUP BY u_1.id) c ON ((c.user_id = u.id)))
-     JOIN ( SELECT u_1.id AS user_id,
-            count(p_1.id) AS posts_count,
-            COALESCE(sum(
-                CASE
-                    WHEN ((r.is_upvote = true) AND (r.post_id IS NOT NULL)) THEN 1
-                    WHEN ((r.is_upvote = false) AND (r.post_id IS NOT NULL)) THEN '-1'::integer
-                    ELSE 0
-                END), (0)::bigint) AS karma
-           FROM ((public.users u_1
-             FULL JOIN public.posts p_1 ON ((p_1.user_id = u_1.id)))
-             FULL JOIN public.reactions r ON ((r.post_id = p_1.id)))
-          GROUP BY u_1.id) p ON ((p.user_id = u.id)));
+    (s.comments_karma + s.posts_karma) AS user_karma,
+    s.comments_count,
+    s.comments_karma,
+    s.posts_count,
+    s.posts_karma
+   FROM (public.users u
+     JOIN public.user_stats s ON ((s.user_id = u.id)));
 
 CREATE TABLE public.user_roles (
     id integer NOT NULL,
@@ -312,8 +414,12 @@ ALTER TABLE ONLY public.comments ALTER COLUMN id SET DEFAULT nextval('public.com
 
 ALTER TABLE ONLY public.messages ALTER COLUMN id SET DEFAULT nextval('public.messages_id_seq'::regclass);
 
+ALTER TABLE ONLY public.notifications ALTER COLUMN id SET DEFAULT nextval('public.notifications_id_seq'::regclass);
+
 ALTER TABLE ONLY public.posts ALTER COLUMN id SET DEFAULT nextval('public.posts_id_seq'::regclass);
 
+ALTER TABLE ONLY public.media_jobs ALTER COLUMN id SET DEFAULT nextval('public.media_jobs_id_seq'::regclass);
+
 ALTER TABLE ONLY public.reactions ALTER COLUMN id SET DEFAULT nextval('public.reactions_id_seq'::regclass);
 
 ALTER TABLE ONLY public.roles ALTER COLUMN id SET DEFAULT nextval('public.roles_id_seq'::regclass);
@@ -331,12 +437,82 @@ ALTER TABLE ONLY public.users ALTER COLUMN id SET DEFAULT nextval('public.users_
 ALTER TABLE ONLY public.comments
     ADD CONSTRAINT comments_pkey PRIMARY KEY (id);
 
+CREATE INDEX comments_post_id_idx ON public.comments USING btree (post_id, id);
+
+CREATE INDEX comments_parent_id_idx ON public.comments USING btree (parent_id, id);
+
+CREATE INDEX comments_search_vector_idx ON public.comments USING gin (search_vector);
+
+ALTER TABLE ONLY public.comment_stats
+    ADD CONSTRAINT comment_stats_pkey PRIMARY KEY (comment_id);
+
 ALTER TABLE ONLY public.messages
     ADD CONSTRAINT messages_pkey PRIMARY KEY (id);
 
+CREATE INDEX messages_sender_receiver_idx ON public.messages USING btree (sender_id, receiver_id, id);
+
+CREATE INDEX messages_unseen_idx ON public.messages USING btree (receiver_id, sender_id) WHERE (NOT seen);
+
+ALTER TABLE ONLY public.conversations
+    ADD CONSTRAINT conversations_pkey PRIMARY KEY (user_id, contact_id);
+
+CREATE INDEX conversations_inbox_idx ON public.conversations USING btree (user_id, last_message_id DESC);
+
+ALTER TABLE ONLY public.notifications
+    ADD CONSTRAINT notifications_pkey PRIMARY KEY (id);
+
+CREATE INDEX notifications_user_id_idx ON public.notifications USING btree (user_id, id DESC);
+
+ALTER TABLE ONLY public.events
+    ADD CONSTRAINT events_pkey PRIMARY KEY (id);
+
+CREATE INDEX events_channel_idx ON public.events USING btree (channel, id);
+
+ALTER TABLE ONLY public.notification_counters
+    ADD CONSTRAINT notification_counters_pkey PRIMARY KEY (user_id);
+
+ALTER TABLE ONLY public.reaction_revisions
+    ADD CONSTRAINT reaction_revisions_pkey PRIMARY KEY (user_id);
+
 ALTER TABLE ONLY public.posts
     ADD CONSTRAINT posts_pkey PRIMARY KEY (id);
 
+ALTER TABLE ONLY public.media_jobs
+    ADD CONSTRAINT media_jobs_pkey PRIMARY KEY (id);
+
+CREATE INDEX media_jobs_status_run_at_idx ON public.media_jobs USING btree (status, run_at, id);
+
+CREATE INDEX media_jobs_target_idx ON public.media_jobs USING btree (target, target_id) WHERE (kind = 'upload'::text);
+
+CREATE INDEX posts_search_vector_idx ON public.posts USING gin (search_vector);
+
+ALTER TABLE ONLY public.post_stats
+    ADD CONSTRAINT post_stats_pkey PRIMARY KEY (post_id);
+
+CREATE INDEX post_stats_karma_idx ON public.post_stats USING btree (karma DESC, post_id DESC);
+
+CREATE INDEX post_stats_created_at_idx ON public.post_stats USING btree (created_at DESC, post_id DESC);
+
+CREATE INDEX post_stats_hot_score_idx ON public.post_stats USING btree (hot_score DESC, post_id DESC);
+
+CREATE INDEX post_stats_subthread_karma_idx ON public.post_stats USING btree (subthread_id, karma DESC, post_id DESC);
+
+CREATE INDEX post_stats_subthread_hot_score_idx ON public.post_stats USING btree (subthread_id, hot_score DESC, post_id DESC);
+
+CREATE INDEX post_stats_subthread_created_at_idx ON public.post_stats USING btree (subthread_id, created_at DESC, post_id DESC);
+
+CREATE INDEX post_stats_user_created_at_idx ON public.post_stats USING btree (user_id, created_at DESC, post_id DESC);
+
+ALTER TABLE ONLY public.post_window_lengths
+    ADD CONSTRAINT post_window_lengths_pkey PRIMARY KEY (duration);
+
+ALTER TABLE ONLY public.post_windows
+    ADD CONSTRAINT post_windows_pkey PRIMARY KEY (post_id, duration);
+
+CREATE INDEX post_windows_karma_idx ON public.post_windows USING btree (duration, karma DESC, post_id DESC);
+
+CREATE INDEX post_windows_created_at_idx ON public.post_windows USING btree (duration, created_at);
+
 ALTER TABLE ONLY public.reactions
     ADD CONSTRAINT reactions_pkey PRIMARY KEY (id);
 
@@ -373,6 +549,11 @@ ALTER TABLE ONLY public.subthreads
 ALTER TABLE ONLY public.subthreads
     ADD CONSTRAINT subthreads_pkey PRIMARY KEY (id);
 
+CREATE INDEX subthreads_search_vector_idx ON public.subthreads USING gin (search_vector);
+
+ALTER TABLE ONLY public.subthread_stats
+    ADD CONSTRAINT subthread_stats_pkey PRIMARY KEY (subthread_id);
+
 ALTER TABLE ONLY public.user_roles
     ADD CONSTRAINT user_roles_pkey PRIMARY KEY (id);
 
@@ -385,6 +566,9 @@ ALTER TABLE ONLY public.users
 ALTER TABLE ONLY public.users
     ADD CONSTRAINT users_pkey PRIMARY KEY (id);
 
+ALTER TABLE ONLY public.user_stats
+    ADD CONSTRAINT user_stats_pkey PRIMARY KEY (user_id);
+
 ALTER TABLE ONLY public.users
     ADD CONSTRAINT users_username_key UNIQUE (username);
 
@@ -403,12 +587,45 @@ ALTER TABLE ONLY public.messages
 ALTER TABLE ONLY public.messages
     ADD CONSTRAINT messages_sender_id_fkey FOREIGN KEY (sender_id) REFERENCES public.users(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
 
+ALTER TABLE ONLY public.conversations
+    ADD CONSTRAINT conversations_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
+
+ALTER TABLE ONLY public.conversations
+    ADD CONSTRAINT conversations_contact_id_fkey FOREIGN KEY (contact_id) REFERENCES public.users(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
+
+ALTER TABLE ONLY public.conversations
+    ADD CONSTRAINT conversations_last_message_id_fkey FOREIGN KEY (last_message_id) REFERENCES public.messages(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
+
+ALTER TABLE ONLY public.notifications
+    ADD CONSTRAINT notifications_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
+
+ALTER TABLE ONLY public.notifications
+    ADD CONSTRAINT notifications_actor_id_fkey FOREIGN KEY (actor_id) REFERENCES public.users(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
+
+ALTER TABLE ONLY public.notifications
+    ADD CONSTRAINT notifications_post_id_fkey FOREIGN KEY (post_id) REFERENCES public.posts(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
+
+ALTER TABLE ONLY public.notifications
+    ADD CONSTRAINT notifications_comment_id_fkey FOREIGN KEY (comment_id) REFERENCES public.comments(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
+
+ALTER TABLE ONLY public.notification_counters
+    ADD CONSTRAINT notification_counters_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
+
+ALTER TABLE ONLY public.reaction_revisions
+    ADD CONSTRAINT reaction_revisions_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
+
 ALTER TABLE ONLY public.posts
     ADD CONSTRAINT posts_subthread_id_fkey FOREIGN KEY (subthread_id) REFERENCES public.subthreads(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
 
 ALTER TABLE ONLY public.posts
     ADD CONSTRAINT posts_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
 
+ALTER TABLE ONLY public.post_windows
+    ADD CONSTRAINT post_windows_post_id_fkey FOREIGN KEY (post_id) REFERENCES public.posts(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
+
+ALTER TABLE ONLY public.post_windows
+    ADD CONSTRAINT post_windows_duration_fkey FOREIGN KEY (duration) REFERENCES public.post_window_lengths(duration) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
+
 ALTER TABLE ONLY public.reactions
     ADD CONSTRAINT reactions_comment_id_fkey FOREIGN KEY (comment_id) REFERENCES public.comments(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
 
@@ -442,6 +659,659 @@ ALTER TABLE ONLY public.user_roles
 ALTER TABLE ONLY public.user_roles
     ADD CONSTRAINT user_roles_user_id_fkey FOREIGN KEY (user_id) REFERENCES public.users(id) ON UPDATE CASCADE ON DELETE CASCADE NOT VALID;
 
+CREATE FUNCTION public.post_hot_score(karma integer, comments integer, posted_at timestamp with time zone)
+    RETURNS double precision
+    LANGUAGE sql STABLE
+    AS $$
+    SELECT CASE
+        WHEN posted_at < now() - interval '7 days' THEN 0
+        ELSE (karma + comments)::double precision
+            / power(extract(epoch FROM now() - posted_at)::double precision / 3600 + 2, 1.5)
+    END;
+$$;
+
+CREATE FUNCTION public.refresh_hot_scores() RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    n integer;
+BEGIN
+    UPDATE public.post_stats
+        SET hot_score = public.post_hot_score(karma, comments_count, created_at)
+        WHERE created_at > now() - interval '8 days'
+            AND hot_score <> public.post_hot_score(karma, comments_count, created_at);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$;
+
+CREATE FUNCTION public.prune_post_windows() RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    n integer;
+BEGIN
+    DELETE FROM public.post_windows w
+        USING public.post_window_lengths l
+        WHERE w.duration = l.duration AND w.created_at < now() - l.length;
+    GET DIAGNOSTICS n = ROW_COUNT;
+    RETURN n;
+END;
+$$;
+
+CREATE FUNCTION public.bump_post_karma(target_id integer, delta integer) RETURNS void
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    author_id integer;
+BEGIN
+    IF delta = 0 THEN
+        RETURN;
+    END IF;
+    UPDATE public.post_stats
+        SET karma = karma + delta, hot_score = public.post_hot_score(karma + delta, comments_count, created_at)
+        WHERE post_id = target_id
+        RETURNING user_id INTO author_id;
+    IF FOUND THEN
+        UPDATE public.post_windows SET karma = karma + delta WHERE post_id = target_id;
+        UPDATE public.user_stats SET posts_karma = posts_karma + delta WHERE user_id = author_id;
+    END IF;
+END;
+$$;
+
+CREATE FUNCTION public.bump_comment_karma(target_id integer, delta integer) RETURNS void
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    author_id integer;
+    parent_post_id integer;
+BEGIN
+    IF delta = 0 THEN
+        RETURN;
+    END IF;
+    UPDATE public.comment_stats SET karma = karma + delta WHERE comment_id = target_id
+        RETURNING user_id, post_id INTO author_id, parent_post_id;
+    IF FOUND THEN
+        UPDATE public.post_stats SET revision = revision + 1 WHERE post_id = parent_post_id;
+        UPDATE public.user_stats SET comments_karma = comments_karma + delta WHERE user_id = author_id;
+    END IF;
+END;
+$$;
+
+CREATE FUNCTION public.reactions_counters() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND OLD.is_upvote = NEW.is_upvote
+        AND OLD.post_id IS NOT DISTINCT FROM NEW.post_id
+        AND OLD.comment_id IS NOT DISTINCT FROM NEW.comment_id THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO public.karma_deltas (post_id, comment_id, delta)
+            VALUES (OLD.post_id, OLD.comment_id, CASE WHEN OLD.is_upvote THEN -1 ELSE 1 END);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO public.karma_deltas (post_id, comment_id, delta)
+            VALUES (NEW.post_id, NEW.comment_id, CASE WHEN NEW.is_upvote THEN 1 ELSE -1 END);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION public.reactions_revisions() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO public.reaction_revisions AS r (user_id, revision)
+            SELECT DISTINCT user_id, 1 FROM old_rows ORDER BY user_id
+            ON CONFLICT (user_id) DO UPDATE SET revision = r.revision + 1;
+    ELSE
+        INSERT INTO public.reaction_revisions AS r (user_id, revision)
+            SELECT DISTINCT user_id, 1 FROM new_rows ORDER BY user_id
+            ON CONFLICT (user_id) DO UPDATE SET revision = r.revision + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION public.flush_karma_deltas() RETURNS SETOF integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    totals jsonb;
+    r record;
+    parent_post_id integer;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('public.karma_deltas')) THEN
+        RETURN;
+    END IF;
+    WITH drained AS (
+        DELETE FROM public.karma_deltas RETURNING post_id, comment_id, delta
+    )
+    SELECT jsonb_agg(t) INTO totals FROM (
+        SELECT post_id, comment_id, sum(delta)::integer AS delta FROM drained
+        GROUP BY post_id, comment_id
+        HAVING sum(delta) <> 0
+        ORDER BY post_id NULLS LAST, comment_id
+    ) t;
+    FOR r IN
+        SELECT * FROM jsonb_to_recordset(COALESCE(totals, '[]'::jsonb)) AS x(post_id integer, comment_id integer, delta integer)
+    LOOP
+        IF r.post_id IS NOT NULL THEN
+            PERFORM public.bump_post_karma(r.post_id, r.delta);
+            RETURN NEXT r.post_id;
+        ELSE
+            PERFORM public.bump_comment_karma(r.comment_id, r.delta);
+            SELECT post_id INTO parent_post_id FROM public.comments WHERE id = r.comment_id;
+            IF FOUND THEN
+                RETURN NEXT parent_post_id;
+            END IF;
+        END IF;
+    END LOOP;
+END;
+$$;
+
+CREATE FUNCTION public.posts_counters() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    old_karma integer;
+    old_comments integer;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO public.post_stats (post_id, user_id, subthread_id, created_at)
+            VALUES (NEW.id, NEW.user_id, NEW.subthread_id, COALESCE(NEW.created_at, CURRENT_TIMESTAMP));
+        PERFORM public.prune_post_windows();
+        INSERT INTO public.post_windows (post_id, duration, subthread_id, created_at)
+            SELECT NEW.id, l.duration, NEW.subthread_id, COALESCE(NEW.created_at, CURRENT_TIMESTAMP)
+            FROM public.post_window_lengths l;
+        UPDATE public.user_stats SET posts_count = posts_count + 1 WHERE user_id = NEW.user_id;
+        UPDATE public.subthread_stats SET posts_count = posts_count + 1 WHERE subthread_id = NEW.subthread_id;
+        RETURN NULL;
+    END IF;
+    -- Cascaded reactions and comments may already have drained these counters;
+    -- whatever is left is removed here so the result is the same in either order.
+    DELETE FROM public.post_stats WHERE post_id = OLD.id RETURNING karma, comments_count INTO old_karma, old_comments;
+    UPDATE public.user_stats
+        SET posts_count = posts_count - 1, posts_karma = posts_karma - COALESCE(old_karma, 0)
+        WHERE user_id = OLD.user_id;
+    UPDATE public.subthread_stats
+        SET posts_count = posts_count - 1, comments_count = comments_count - COALESCE(old_comments, 0)
+        WHERE subthread_id = OLD.subthread_id;
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION public.comments_counters() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    thread_id integer;
+    old_karma integer;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE public.post_stats
+            SET comments_count = comments_count + 1, hot_score = public.post_hot_score(karma, comments_count + 1, created_at)
+            WHERE post_id = NEW.post_id
+            RETURNING subthread_id INTO thread_id;
+        INSERT INTO public.comment_stats (comment_id, user_id, post_id) VALUES (NEW.id, NEW.user_id, NEW.post_id);
+        UPDATE public.user_stats SET comments_count = comments_count + 1 WHERE user_id = NEW.user_id;
+        UPDATE public.subthread_stats SET comments_count = comments_count + 1 WHERE subthread_id = thread_id;
+        RETURN NULL;
+    END IF;
+    UPDATE public.post_stats
+        SET comments_count = comments_count - 1, hot_score = public.post_hot_score(karma, comments_count - 1, created_at)
+        WHERE post_id = OLD.post_id
+        RETURNING subthread_id INTO thread_id;
+    DELETE FROM public.comment_stats WHERE comment_id = OLD.id RETURNING karma INTO old_karma;
+    UPDATE public.user_stats
+        SET comments_count = comments_count - 1, comments_karma = comments_karma - COALESCE(old_karma, 0)
+        WHERE user_id = OLD.user_id;
+    UPDATE public.subthread_stats SET comments_count = comments_count - 1 WHERE subthread_id = thread_id;
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION public.subscriptions_counters() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE public.subthread_stats SET members_count = members_count + 1 WHERE subthread_id = NEW.subthread_id;
+    ELSE
+        UPDATE public.subthread_stats SET members_count = members_count - 1 WHERE subthread_id = OLD.subthread_id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION public.users_counters() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO public.user_stats (user_id) VALUES (NEW.id);
+    ELSE
+        DELETE FROM public.user_stats WHERE user_id = OLD.id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION public.subthreads_counters() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO public.subthread_stats (subthread_id) VALUES (NEW.id);
+    ELSE
+        DELETE FROM public.subthread_stats WHERE subthread_id = OLD.id;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION public.touch_conversation(owner_id integer, other_id integer, message_id integer, unread integer) RETURNS void
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    INSERT INTO public.conversations AS c (user_id, contact_id, last_message_id, unread_count)
+        VALUES (owner_id, other_id, message_id, unread)
+        ON CONFLICT (user_id, contact_id) DO UPDATE
+            SET last_message_id = GREATEST(c.last_message_id, EXCLUDED.last_message_id),
+                unread_count = c.unread_count + EXCLUDED.unread_count;
+END;
+$$;
+
+CREATE FUNCTION public.messages_conversations() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    -- lock both rows in user id order so two people replying to each other cannot deadlock
+    IF NEW.sender_id <= NEW.receiver_id THEN
+        PERFORM public.touch_conversation(NEW.sender_id, NEW.receiver_id, NEW.id, 0);
+        PERFORM public.touch_conversation(NEW.receiver_id, NEW.sender_id, NEW.id, CASE WHEN NEW.seen THEN 0 ELSE 1 END);
+    ELSE
+        PERFORM public.touch_conversation(NEW.receiver_id, NEW.sender_id, NEW.id, CASE WHEN NEW.seen THEN 0 ELSE 1 END);
+        PERFORM public.touch_conversation(NEW.sender_id, NEW.receiver_id, NEW.id, 0);
+    END IF;
+    IF NOT NEW.seen THEN
+        INSERT INTO public.notification_counters AS c (user_id, unread_messages) VALUES (NEW.receiver_id, 1)
+            ON CONFLICT (user_id) DO UPDATE SET unread_messages = c.unread_messages + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION public.messages_unread() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    WITH d AS (
+        SELECT n.receiver_id, n.sender_id, sum(CASE WHEN n.seen THEN -1 ELSE 1 END)::integer AS delta
+        FROM new_rows n JOIN old_rows o ON o.id = n.id
+        WHERE o.seen IS DISTINCT FROM n.seen
+        GROUP BY n.receiver_id, n.sender_id
+    ), touched AS (
+        UPDATE public.conversations c
+            SET unread_count = GREATEST(c.unread_count + d.delta, 0)
+            FROM d
+            WHERE c.user_id = d.receiver_id AND c.contact_id = d.sender_id
+    )
+    UPDATE public.notification_counters c
+        SET unread_messages = GREATEST(c.unread_messages + t.delta, 0)
+        FROM (SELECT receiver_id, sum(delta)::integer AS delta FROM d GROUP BY receiver_id) t
+        WHERE c.user_id = t.receiver_id;
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION public.notify_users(recipients integer[], kinds text[], actor integer, target_post integer, target_comment integer, cap integer) RETURNS void
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    INSERT INTO public.notifications (user_id, kind, actor_id, post_id, comment_id)
+        SELECT DISTINCT ON (r.user_id) r.user_id, r.kind, actor, target_post, target_comment
+        FROM unnest(recipients, kinds) WITH ORDINALITY AS r(user_id, kind, ord)
+        WHERE r.user_id IS NOT NULL AND r.user_id IS DISTINCT FROM actor
+        ORDER BY r.user_id, r.ord;
+    INSERT INTO public.notification_counters AS c (user_id, unread_notifications)
+        SELECT DISTINCT r.user_id, 1 FROM unnest(recipients) AS r(user_id)
+        WHERE r.user_id IS NOT NULL AND r.user_id IS DISTINCT FROM actor
+        ORDER BY r.user_id
+        ON CONFLICT (user_id) DO UPDATE SET unread_notifications = c.unread_notifications + 1;
+    -- keep only the newest cap notifications per user; notifications_deleted fixes the counters
+    DELETE FROM public.notifications n
+        USING (SELECT DISTINCT r FROM unnest(recipients) r) u
+        WHERE n.user_id = u.r AND n.id <= (
+            SELECT m.id FROM public.notifications m WHERE m.user_id = u.r ORDER BY m.id DESC OFFSET cap LIMIT 1
+        );
+END;
+$$;
+
+-- pruning and cascades from deleted posts, comments and users take unseen rows with them
+CREATE FUNCTION public.notifications_deleted() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    UPDATE public.notification_counters c
+        SET unread_notifications = GREATEST(c.unread_notifications - d.unseen, 0)
+        FROM (SELECT user_id, count(*)::integer AS unseen FROM old_rows WHERE NOT seen GROUP BY user_id) d
+        WHERE c.user_id = d.user_id;
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION public.messages_deleted() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    WITH d AS (
+        SELECT receiver_id, sender_id, count(*)::integer AS unseen
+        FROM old_rows WHERE NOT seen
+        GROUP BY receiver_id, sender_id
+    ), touched AS (
+        UPDATE public.conversations c
+            SET unread_count = GREATEST(c.unread_count - d.unseen, 0)
+            FROM d
+            WHERE c.user_id = d.receiver_id AND c.contact_id = d.sender_id
+    )
+    UPDATE public.notification_counters c
+        SET unread_messages = GREATEST(c.unread_messages - t.unseen, 0)
+        FROM (SELECT receiver_id, sum(unseen)::integer AS unseen FROM d GROUP BY receiver_id) t
+        WHERE c.user_id = t.receiver_id;
+    RETURN NULL;
+END;
+$$;
+
+CREATE FUNCTION public.publish_event(target text, kind text, body text, cap integer) RETURNS bigint
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    event_id bigint;
+    payload text;
+BEGIN
+    -- held until commit so ids become visible in order and a reader can resume after the last id it saw
+    PERFORM pg_advisory_xact_lock(hashtext('public.events'));
+    INSERT INTO public.events (channel, event, data) VALUES (target, kind, body) RETURNING id INTO event_id;
+    DELETE FROM public.events e
+        WHERE e.channel = target AND e.id <= (
+            SELECT m.id FROM public.events m WHERE m.channel = target ORDER BY m.id DESC OFFSET cap LIMIT 1
+        );
+    payload := json_build_object('id', event_id, 'channel', target, 'event', kind, 'data', body)::text;
+    IF octet_length(payload) > 7900 THEN
+        -- NOTIFY payloads are capped at 8000 bytes, listeners read the body from the table instead
+        payload := json_build_object('id', event_id, 'channel', target, 'event', kind)::text;
+    END IF;
+    PERFORM pg_notify('threaddit_events', payload);
+    RETURN event_id;
+END;
+$$;
+
+CREATE TRIGGER messages_conversations AFTER INSERT ON public.messages
+    FOR EACH ROW EXECUTE FUNCTION public.messages_conversations();
+
+CREATE TRIGGER messages_unread AFTER UPDATE ON public.messages
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.messages_unread();
+
+CREATE TRIGGER messages_deleted AFTER DELETE ON public.messages
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.messages_deleted();
+
+CREATE TRIGGER notifications_deleted AFTER DELETE ON public.notifications
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notifications_deleted();
+
+CREATE TRIGGER reactions_counters AFTER INSERT OR DELETE OR UPDATE ON public.reactions
+    FOR EACH ROW EXECUTE FUNCTION public.reactions_counters();
+
+-- transition tables allow one event per trigger
+CREATE TRIGGER reactions_revisions_insert AFTER INSERT ON public.reactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.reactions_revisions();
+
+CREATE TRIGGER reactions_revisions_update AFTER UPDATE ON public.reactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.reactions_revisions();
+
+CREATE TRIGGER reactions_revisions_delete AFTER DELETE ON public.reactions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.reactions_revisions();
+
+CREATE TRIGGER posts_counters AFTER INSERT OR DELETE ON public.posts
+    FOR EACH ROW EXECUTE FUNCTION public.posts_counters();
+
+CREATE TRIGGER comments_counters AFTER INSERT OR DELETE ON public.comments
+    FOR EACH ROW EXECUTE FUNCTION public.comments_counters();
+
+CREATE TRIGGER subscriptions_counters AFTER INSERT OR DELETE ON public.subscriptions
+    FOR EACH ROW EXECUTE FUNCTION public.subscriptions_counters();
+
+CREATE TRIGGER users_counters AFTER INSERT OR DELETE ON public.users
+    FOR EACH ROW EXECUTE FUNCTION public.users_counters();
+
+CREATE TRIGGER subthreads_counters AFTER INSERT OR DELETE ON public.subthreads
+    FOR EACH ROW EXECUTE FUNCTION public.subthreads_counters();
+
+CREATE FUNCTION public.bump_revision() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF NEW.revision = OLD.revision THEN
+        NEW.revision := OLD.revision + 1;
+    END IF;
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$;
+
+-- hot_score refreshes do not change any response, so they leave the revision alone
+CREATE TRIGGER post_stats_revision BEFORE UPDATE ON public.post_stats
+    FOR EACH ROW
+    WHEN ((OLD.karma, OLD.comments_count, OLD.revision) IS DISTINCT FROM (NEW.karma, NEW.comments_count, NEW.revision))
+    EXECUTE FUNCTION public.bump_revision();
+
+CREATE TRIGGER user_stats_revision BEFORE UPDATE ON public.user_stats
+    FOR EACH ROW WHEN (OLD IS DISTINCT FROM NEW) EXECUTE FUNCTION public.bump_revision();
+
+CREATE TRIGGER subthread_stats_revision BEFORE UPDATE ON public.subthread_stats
+    FOR EACH ROW WHEN (OLD IS DISTINCT FROM NEW) EXECUTE FUNCTION public.bump_revision();
+
+CREATE FUNCTION public.touch_revisions() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    CASE TG_TABLE_NAME
+    WHEN 'posts' THEN
+        UPDATE public.post_stats SET revision = revision + 1 WHERE post_id = NEW.id;
+    WHEN 'comments' THEN
+        UPDATE public.post_stats SET revision = revision + 1 WHERE post_id = NEW.post_id;
+    WHEN 'saved' THEN
+        UPDATE public.post_stats SET revision = revision + 1
+            WHERE post_id = CASE WHEN TG_OP = 'DELETE' THEN OLD.post_id ELSE NEW.post_id END;
+    WHEN 'users' THEN
+        IF (OLD.username, OLD.avatar) IS DISTINCT FROM (NEW.username, NEW.avatar) THEN
+            UPDATE public.post_stats SET revision = revision + 1
+                WHERE user_id = NEW.id
+                    OR post_id IN (SELECT c.post_id FROM public.comment_stats c WHERE c.user_id = NEW.id);
+        END IF;
+        UPDATE public.user_stats SET revision = revision + 1 WHERE user_id = NEW.id;
+    WHEN 'subthreads' THEN
+        IF (OLD.name, OLD.logo) IS DISTINCT FROM (NEW.name, NEW.logo) THEN
+            UPDATE public.post_stats SET revision = revision + 1 WHERE subthread_id = NEW.id;
+        END IF;
+        UPDATE public.subthread_stats SET revision = revision + 1 WHERE subthread_id = NEW.id;
+    WHEN 'user_roles' THEN
+        UPDATE public.user_stats SET revision = revision + 1
+            WHERE user_id IN (OLD.user_id, NEW.user_id);
+        UPDATE public.subthread_stats SET revision = revision + 1
+            WHERE subthread_id IN (OLD.subthread_id, NEW.subthread_id);
+    END CASE;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER posts_revisions AFTER UPDATE ON public.posts
+    FOR EACH ROW EXECUTE FUNCTION public.touch_revisions();
+
+CREATE TRIGGER comments_revisions AFTER UPDATE ON public.comments
+    FOR EACH ROW EXECUTE FUNCTION public.touch_revisions();
+
+CREATE TRIGGER saved_revisions AFTER INSERT OR DELETE ON public.saved
+    FOR EACH ROW EXECUTE FUNCTION public.touch_revisions();
+
+CREATE TRIGGER users_revisions AFTER UPDATE ON public.users
+    FOR EACH ROW EXECUTE FUNCTION public.touch_revisions();
+
+CREATE TRIGGER subthreads_revisions AFTER UPDATE ON public.subthreads
+    FOR EACH ROW EXECUTE FUNCTION public.touch_revisions();
+
+CREATE TRIGGER user_roles_revisions AFTER INSERT OR DELETE OR UPDATE ON public.user_roles
+    FOR EACH ROW EXECUTE FUNCTION public.touch_revisions();
+
+CREATE FUNCTION public.reconcile_counters() RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    fixed integer := 0;
+    n integer;
+BEGIN
+    LOCK TABLE public.post_stats, public.post_windows, public.comment_stats, public.user_stats, public.subthread_stats,
+        public.karma_deltas, public.conversations, public.notification_counters
+        IN SHARE ROW EXCLUSIVE MODE;
+    -- the recount below already includes every reaction these deltas came from
+    DELETE FROM public.karma_deltas;
+
+    INSERT INTO public.post_stats AS s (post_id, user_id, subthread_id, created_at, karma, comments_count)
+    SELECT p.id,
+        p.user_id,
+        p.subthread_id,
+        COALESCE(p.created_at, CURRENT_TIMESTAMP),
+        COALESCE((SELECT sum(CASE WHEN r.is_upvote THEN 1 ELSE -1 END) FROM public.reactions r WHERE r.post_id = p.id), 0),
+        (SELECT count(*) FROM public.comments c WHERE c.post_id = p.id)
+    FROM public.posts p
+    ON CONFLICT (post_id) DO UPDATE
+        SET user_id = EXCLUDED.user_id, subthread_id = EXCLUDED.subthread_id, created_at = EXCLUDED.created_at,
+            karma = EXCLUDED.karma, comments_count = EXCLUDED.comments_count
+        WHERE (s.user_id, s.subthread_id, s.created_at, s.karma, s.comments_count)
+            IS DISTINCT FROM (EXCLUDED.user_id, EXCLUDED.subthread_id, EXCLUDED.created_at, EXCLUDED.karma, EXCLUDED.comments_count);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    fixed := fixed + n;
+    DELETE FROM public.post_stats s WHERE NOT EXISTS (SELECT 1 FROM public.posts p WHERE p.id = s.post_id);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    fixed := fixed + n;
+
+    INSERT INTO public.post_windows AS w (post_id, duration, subthread_id, created_at, karma)
+    SELECT s.post_id, l.duration, s.subthread_id, s.created_at, s.karma
+    FROM public.post_stats s
+        JOIN public.post_window_lengths l ON s.created_at >= now() - l.length
+    ON CONFLICT (post_id, duration) DO UPDATE
+        SET subthread_id = EXCLUDED.subthread_id, created_at = EXCLUDED.created_at, karma = EXCLUDED.karma
+        WHERE (w.subthread_id, w.created_at, w.karma)
+            IS DISTINCT FROM (EXCLUDED.subthread_id, EXCLUDED.created_at, EXCLUDED.karma);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    fixed := fixed + n;
+    fixed := fixed + public.prune_post_windows();
+
+    INSERT INTO public.comment_stats AS s (comment_id, user_id, post_id, karma)
+    SELECT c.id,
+        c.user_id,
+        c.post_id,
+        COALESCE((SELECT sum(CASE WHEN r.is_upvote THEN 1 ELSE -1 END) FROM public.reactions r WHERE r.comment_id = c.id), 0)
+    FROM public.comments c
+    ON CONFLICT (comment_id) DO UPDATE
+        SET user_id = EXCLUDED.user_id, post_id = EXCLUDED.post_id, karma = EXCLUDED.karma
+        WHERE (s.user_id, s.post_id, s.karma) IS DISTINCT FROM (EXCLUDED.user_id, EXCLUDED.post_id, EXCLUDED.karma);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    fixed := fixed + n;
+    DELETE FROM public.comment_stats s WHERE NOT EXISTS (SELECT 1 FROM public.comments c WHERE c.id = s.comment_id);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    fixed := fixed + n;
+
+    INSERT INTO public.user_stats AS s (user_id, posts_count, posts_karma, comments_count, comments_karma)
+    SELECT u.id,
+        (SELECT count(*) FROM public.post_stats p WHERE p.user_id = u.id),
+        (SELECT COALESCE(sum(p.karma), 0) FROM public.post_stats p WHERE p.user_id = u.id),
+        (SELECT count(*) FROM public.comment_stats c WHERE c.user_id = u.id),
+        (SELECT COALESCE(sum(c.karma), 0) FROM public.comment_stats c WHERE c.user_id = u.id)
+    FROM public.users u
+    ON CONFLICT (user_id) DO UPDATE
+        SET posts_count = EXCLUDED.posts_count, posts_karma = EXCLUDED.posts_karma,
+            comments_count = EXCLUDED.comments_count, comments_karma = EXCLUDED.comments_karma
+        WHERE (s.posts_count, s.posts_karma, s.comments_count, s.comments_karma)
+            IS DISTINCT FROM (EXCLUDED.posts_count, EXCLUDED.posts_karma, EXCLUDED.comments_count, EXCLUDED.comments_karma);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    fixed := fixed + n;
+    DELETE FROM public.user_stats s WHERE NOT EXISTS (SELECT 1 FROM public.users u WHERE u.id = s.user_id);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    fixed := fixed + n;
+
+    INSERT INTO public.subthread_stats AS s (subthread_id, members_count, posts_count, comments_count)
+    SELECT t.id,
+        (SELECT count(*) FROM public.subscriptions m WHERE m.subthread_id = t.id),
+        (SELECT count(*) FROM public.post_stats p WHERE p.subthread_id = t.id),
+        (SELECT COALESCE(sum(p.comments_count), 0) FROM public.post_stats p WHERE p.subthread_id = t.id)
+    FROM public.subthreads t
+    ON CONFLICT (subthread_id) DO UPDATE
+        SET members_count = EXCLUDED.members_count, posts_count = EXCLUDED.posts_count,
+            comments_count = EXCLUDED.comments_count
+        WHERE (s.members_count, s.posts_count, s.comments_count)
+            IS DISTINCT FROM (EXCLUDED.members_count, EXCLUDED.posts_count, EXCLUDED.comments_count);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    fixed := fixed + n;
+    DELETE FROM public.subthread_stats s WHERE NOT EXISTS (SELECT 1 FROM public.subthreads t WHERE t.id = s.subthread_id);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    fixed := fixed + n;
+
+    INSERT INTO public.conversations AS c (user_id, contact_id, last_message_id, unread_count)
+    SELECT m.owner_id, m.other_id, max(m.id), count(*) FILTER (WHERE m.unread)
+    FROM (
+        SELECT sender_id AS owner_id, receiver_id AS other_id, id, false AS unread FROM public.messages
+        UNION ALL
+        SELECT receiver_id, sender_id, id, NOT seen FROM public.messages
+    ) m
+    GROUP BY m.owner_id, m.other_id
+    ON CONFLICT (user_id, contact_id) DO UPDATE
+        SET last_message_id = EXCLUDED.last_message_id, unread_count = EXCLUDED.unread_count
+        WHERE (c.last_message_id, c.unread_count) IS DISTINCT FROM (EXCLUDED.last_message_id, EXCLUDED.unread_count);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    fixed := fixed + n;
+    DELETE FROM public.conversations c WHERE NOT EXISTS (
+        SELECT 1 FROM public.messages m
+        WHERE (m.sender_id = c.user_id AND m.receiver_id = c.contact_id)
+            OR (m.sender_id = c.contact_id AND m.receiver_id = c.user_id)
+    );
+    GET DIAGNOSTICS n = ROW_COUNT;
+    fixed := fixed + n;
+
+    INSERT INTO public.notification_counters AS c (user_id, unread_notifications, unread_messages)
+    SELECT u.id,
+        (SELECT count(*) FROM public.notifications n WHERE n.user_id = u.id AND NOT n.seen),
+        (SELECT COALESCE(sum(v.unread_count), 0) FROM public.conversations v WHERE v.user_id = u.id)
+    FROM public.users u
+    ON CONFLICT (user_id) DO UPDATE
+        SET unread_notifications = EXCLUDED.unread_notifications, unread_messages = EXCLUDED.unread_messages
+        WHERE (c.unread_notifications, c.unread_messages)
+            IS DISTINCT FROM (EXCLUDED.unread_notifications, EXCLUDED.unread_messages);
+    GET DIAGNOSTICS n = ROW_COUNT;
+    fixed := fixed + n;
+
+    UPDATE public.post_stats SET hot_score = public.post_hot_score(karma, comments_count, created_at);
+
+    RETURN fixed;
+END;
+$$;
+
+INSERT INTO post_window_lengths(duration, length) VALUES
+	('day', interval '1 day'),
+	('week', interval '7 days'),
+	('month', interval '30 days'),
+	('year', interval '365 days');
+
 INSERT INTO roles(name, slug) VALUES 
 	('Thread Moderator','mod'),
 	('Administrator', 'admin');
\ No newline at end of file
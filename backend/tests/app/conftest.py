@@ -0,0 +1,8 @@
+import pytest
+from dotenv import dotenv_values
+
+# The app reads its settings from backend/.env at import time. These tests need it to point at a
+# scratch SQLite database with MEDIA_WORKERS="0", so no background worker races the test.
+settings = dotenv_values()
+if not settings.get("DATABASE_URI", "").startswith("sqlite") or settings.get("MEDIA_WORKERS", "2") != "0":
+    pytest.skip('needs a .env with a SQLite DATABASE_URI and MEDIA_WORKERS="0"', allow_module_level=True)
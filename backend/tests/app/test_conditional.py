@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+from werkzeug.http import http_date
+from threaddit import app
+from threaddit.conditional import conditional
+
+UPDATED_AT = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+@conditional(lambda: (7, UPDATED_AT))
+def view():
+    return {"ok": True}
+
+
+def get(headers=None):
+    with app.test_request_context("/api/test", headers=headers):
+        return view()
+
+
+def test_matching_etag_is_not_modified():
+    etag = get().get_etag()[0]
+    assert get({"If-None-Match": f'W/"{etag}"'}).status_code == 304
+
+
+def test_if_modified_since_alone_does_not_give_304():
+    response = get({"If-Modified-Since": http_date(UPDATED_AT)})
+    assert response.status_code == 200
+    assert response.last_modified == UPDATED_AT
@@ -0,0 +1,74 @@
+import pytest
+from flask import Flask, jsonify
+from flask_sqlalchemy import SQLAlchemy
+from threaddit.database import RoutingSession, stick_to_primary
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = Flask(__name__)
+    app.config["SECRET_KEY"] = "test"
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'primary.db'}"
+    app.config["SQLALCHEMY_BINDS"] = {"replica_0": f"sqlite:///{tmp_path / 'replica.db'}"}
+    app.config["DATABASE_STICKY_SECONDS"] = 5
+    db = SQLAlchemy(app, session_options={"class_": RoutingSession})
+    app.after_request(stick_to_primary)
+
+    class Item(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.Text)
+
+    with app.app_context():
+        for engine, name in ((db.engines[None], "primary"), (db.engines["replica_0"], "replica")):
+            Item.__table__.create(engine)
+            with engine.begin() as conn:
+                conn.execute(Item.__table__.insert().values(id=1, name=name))
+
+    def source(locked=False):
+        query = Item.query.filter_by(id=1)
+        return query.with_for_update().one().name if locked else query.one().name
+
+    @app.route("/item", methods=["GET", "POST"])
+    def read():
+        return jsonify(source())
+
+    @app.route("/locked")
+    def locked():
+        return jsonify(source(locked=True))
+
+    @app.route("/write", methods=["POST"])
+    def write():
+        db.session.add(Item(id=2, name="new"))
+        db.session.commit()
+        return jsonify(source())
+
+    @app.route("/write-on-get")
+    def write_on_get():
+        db.session.add(Item(id=2, name="new"))
+        db.session.flush()
+        return jsonify(source())
+
+    return app.test_client()
+
+
+def test_get_reads_from_replica(client):
+    assert client.get("/item").json == "replica"
+
+
+def test_post_reads_from_primary(client):
+    assert client.post("/item").json == "primary"
+
+
+def test_for_update_reads_from_primary(client):
+    assert client.get("/locked").json == "primary"
+
+
+def test_reads_after_a_write_stay_on_primary(client):
+    assert client.get("/write-on-get").json == "primary"
+
+
+def test_client_sticks_to_primary_after_a_write(client):
+    assert client.post("/write").json == "primary"
+    assert client.get("/item").json == "primary"
+    client.delete_cookie("session")
+    assert client.get("/item").json == "replica"
@@ -0,0 +1,26 @@
+from threaddit.events.broker import CLOSED, MemoryBroker, Subscription
+
+
+def drain(subscription):
+    items = []
+    while (item := subscription.get(timeout=0)) not in (None, CLOSED):
+        items.append(item)
+    return items
+
+
+def test_held_events_follow_replay_without_duplicates():
+    subscription = Subscription(["post:1"])
+    subscription.hold()
+    subscription.put((3, "comment", "{}"))
+    subscription.put((4, "comment", "{}"))
+    subscription.release([(2, "comment", "{}"), (3, "comment", "{}")])
+    subscription.put((5, "comment", "{}"))
+    assert [item[0] for item in drain(subscription)] == [2, 3, 4, 5]
+
+
+def test_memory_broker_replays_after_last_event_id():
+    broker = MemoryBroker(replay_size=2)
+    for i in range(3):
+        broker.publish("post:1", "comment", {"i": i})
+    subscription = broker.subscribe(["post:1"], last_event_id=1)
+    assert [item[0] for item in drain(subscription)] == [2, 3]
@@ -0,0 +1,35 @@
+import io
+import pytest
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.test import EnvironBuilder
+from threaddit import app
+from threaddit.media.ingest import UploadRequest
+
+
+def upload_request(size):
+    builder = EnvironBuilder(method="POST", data={"media": (io.BytesIO(b"x" * size), "image.png", "image/png")})
+    return UploadRequest(builder.get_environ())
+
+
+@pytest.fixture
+def spool(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "MEDIA_SPOOL_DIR", str(tmp_path))
+    monkeypatch.setitem(app.config, "MEDIA_SPOOL_THRESHOLD", 100 * 1024)
+    monkeypatch.setitem(app.config, "MEDIA_SIZE_LIMITS", {"image/": 2 * 1024 * 1024, "video/": 2 * 1024 * 1024})
+    with app.app_context():
+        yield tmp_path
+
+
+def test_oversized_upload_removes_spool_file(spool):
+    request = upload_request(3 * 1024 * 1024)
+    with pytest.raises(RequestEntityTooLarge):
+        request.files
+    assert list(spool.iterdir()) == []
+
+
+def test_large_upload_is_spooled_to_disk(spool):
+    request = upload_request(1024 * 1024)
+    media = request.files["media"]
+    assert [path.suffix for path in spool.iterdir()] == [".part"]
+    media.stream.close()
+    assert list(spool.iterdir()) == []
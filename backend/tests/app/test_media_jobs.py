@@ -0,0 +1,78 @@
+import io
+import os
+import pytest
+from werkzeug.datastructures import FileStorage
+from threaddit import app, db
+from threaddit.media import jobs
+from threaddit.media.jobs import MediaJob, enqueue_upload, process_next_job
+from threaddit.media.storage import FakeStorage
+
+POSTS = "CREATE TABLE posts (id INTEGER PRIMARY KEY, media TEXT, media_state TEXT)"
+
+
+@pytest.fixture
+def post(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, "MEDIA_SPOOL_DIR", str(tmp_path))
+    with app.app_context():
+        MediaJob.__table__.create(db.engine)
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql(POSTS)
+            conn.exec_driver_sql("INSERT INTO posts (id, media_state) VALUES (1, 'processing')")
+        try:
+            yield 1
+        finally:
+            db.session.remove()
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql("DROP TABLE posts")
+            MediaJob.__table__.drop(db.engine)
+
+
+def queue_upload(post_id):
+    file = FileStorage(io.BytesIO(b"image bytes"), filename="cat.png", content_type="image/png")
+    enqueue_upload("posts", post_id, file, "c_fill")
+    db.session.commit()
+    return MediaJob.query.one().path
+
+
+def get_post(post_id):
+    return db.session.execute(db.text("SELECT media, media_state FROM posts WHERE id = :id"), {"id": post_id}).one()
+
+
+def test_upload_job_sets_post_media(post, monkeypatch):
+    storage = FakeStorage()
+    monkeypatch.setattr(jobs, "storage", storage)
+    with app.app_context():
+        path = queue_upload(post)
+        assert process_next_job()
+        assert not process_next_job()
+        url = storage.uploads[0][1]
+        assert get_post(post) == (url, "ready")
+        assert MediaJob.query.count() == 0
+    assert not os.path.exists(path)
+
+
+def test_upload_job_marks_post_failed_after_last_attempt(post, monkeypatch):
+    storage = FakeStorage(failures=1)
+    monkeypatch.setattr(jobs, "storage", storage)
+    monkeypatch.setitem(app.config, "MEDIA_JOB_ATTEMPTS", 1)
+    with app.app_context():
+        queue_upload(post)
+        assert process_next_job()
+        job = MediaJob.query.one()
+        assert (job.status, job.last_error) == ("failed", "Fake upload failure")
+        assert get_post(post) == (None, "failed")
+        assert storage.uploads == []
+
+
+def test_failure_after_job_finished_is_not_retried(post, monkeypatch):
+    monkeypatch.setattr(jobs, "storage", FakeStorage())
+
+    def invalidate_target(target, target_id):
+        raise Exception("cache unavailable")
+
+    monkeypatch.setattr(jobs, "invalidate_target", invalidate_target)
+    with app.app_context():
+        queue_upload(post)
+        assert process_next_job()
+        assert get_post(post)[1] == "ready"
+        assert MediaJob.query.count() == 0
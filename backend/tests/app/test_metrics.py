@@ -0,0 +1,21 @@
+import pytest
+from threaddit import app
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", "secret")
+    return app.test_client()
+
+
+def test_metrics_requires_token(client):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert b"threaddit_request_seconds" in response.data
+
+
+def test_metrics_disabled_without_token(client, monkeypatch):
+    monkeypatch.setitem(app.config, "METRICS_TOKEN", None)
+    assert client.get("/metrics", headers={"Authorization": "Bearer secret"}).status_code == 404
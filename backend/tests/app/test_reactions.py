@@ -0,0 +1,15 @@
+import pytest
+from threaddit.reactions.routes import InvalidReaction, parse_votes
+
+
+def test_parse_votes_keeps_last_vote_per_target():
+    assert parse_votes([{"id": 1, "is_upvote": True}, {"id": 2, "is_upvote": None}, {"id": 1, "is_upvote": False}]) == {
+        1: False,
+        2: None,
+    }
+
+
+@pytest.mark.parametrize("items", [{}, [1], [{"id": 1}], [{"id": "1", "is_upvote": True}], [{"id": 1, "is_upvote": 1}]])
+def test_parse_votes_rejects_malformed_items(items):
+    with pytest.raises(InvalidReaction):
+        parse_votes(items)
@@ -0,0 +1,60 @@
+import os
+import uuid
+import pytest
+from dotenv import dotenv_values
+from sqlalchemy import create_engine, text
+
+# These tests load schema.sql into a throwaway database, so they need a Postgres server and a role
+# allowed to CREATE DATABASE. Point TEST_DATABASE_URI (environment or backend/.env) at it.
+TEST_DATABASE_URI = os.environ.get("TEST_DATABASE_URI") or dotenv_values().get("TEST_DATABASE_URI")
+if not TEST_DATABASE_URI:
+    pytest.skip("needs TEST_DATABASE_URI pointing at a Postgres server", allow_module_level=True)
+
+SCHEMA = os.path.join(os.path.dirname(__file__), "..", "..", "schema.sql")
+
+
+@pytest.fixture(scope="session")
+def engine():
+    server = create_engine(TEST_DATABASE_URI, isolation_level="AUTOCOMMIT")
+    name = f"threaddit_test_{uuid.uuid4().hex[:8]}"
+    with server.connect() as conn:
+        conn.execute(text(f'CREATE DATABASE "{name}"'))
+    engine = create_engine(server.url.set(database=name))
+    try:
+        with engine.begin() as conn, open(SCHEMA) as schema:
+            conn.connection.cursor().execute(schema.read())
+        yield engine
+    finally:
+        engine.dispose()
+        with server.connect() as conn:
+            conn.execute(text(f'DROP DATABASE "{name}"'))
+        server.dispose()
+
+
+@pytest.fixture
+def conn(engine):
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            yield conn
+        finally:
+            trans.rollback()
+
+
+@pytest.fixture
+def users(conn):
+    return conn.execute(
+        text(
+            "INSERT INTO users (username, password_hash, email) "
+            "SELECT 'user' || i, 'x', 'user' || i || '@example.com' FROM generate_series(1, 3) i RETURNING id"
+        )
+    ).scalars().all()
+
+
+@pytest.fixture
+def post(conn, users):
+    subthread = conn.execute(text("INSERT INTO subthreads (name, created_by) VALUES ('t/test', :u) RETURNING id"), {"u": users[0]})
+    return conn.execute(
+        text("INSERT INTO posts (user_id, subthread_id, title) VALUES (:u, :s, 'title') RETURNING id"),
+        {"u": users[0], "s": subthread.scalar()},
+    ).scalar()
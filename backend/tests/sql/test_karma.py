@@ -0,0 +1,58 @@
+from sqlalchemy import text
+
+
+def vote(conn, user_id, post_id=None, comment_id=None, is_upvote=True):
+    conn.execute(
+        text("INSERT INTO reactions (user_id, post_id, comment_id, is_upvote) VALUES (:u, :p, :c, :v)"),
+        {"u": user_id, "p": post_id, "c": comment_id, "v": is_upvote},
+    )
+
+
+def flush(conn):
+    return conn.execute(text("SELECT * FROM flush_karma_deltas()")).scalars().all()
+
+
+def post_stats(conn, post_id):
+    return conn.execute(text("SELECT karma, revision FROM post_stats WHERE post_id = :p"), {"p": post_id}).one()
+
+
+def test_votes_wait_for_the_flush(conn, users, post):
+    vote(conn, users[1], post)
+    vote(conn, users[2], post)
+    assert post_stats(conn, post) == (0, 0)
+    assert flush(conn) == [post]
+    assert post_stats(conn, post) == (2, 1)
+    assert conn.execute(text("SELECT posts_karma FROM user_stats WHERE user_id = :u"), {"u": users[0]}).scalar() == 2
+    assert conn.execute(text("SELECT count(*) FROM karma_deltas")).scalar() == 0
+
+
+def test_comment_votes_flush_to_the_parent_post(conn, users, post):
+    comment = conn.execute(
+        text("INSERT INTO comments (user_id, post_id, content) VALUES (:u, :p, 'hi') RETURNING id"), {"u": users[1], "p": post}
+    ).scalar()
+    vote(conn, users[2], comment_id=comment, is_upvote=False)
+    karma, revision = post_stats(conn, post)
+    assert flush(conn) == [post]
+    assert conn.execute(text("SELECT karma FROM comment_stats WHERE comment_id = :c"), {"c": comment}).scalar() == -1
+    assert post_stats(conn, post) == (karma, revision + 1)
+
+
+def test_cancelled_votes_do_not_touch_the_post(conn, users, post):
+    vote(conn, users[1], post)
+    conn.execute(text("UPDATE reactions SET is_upvote = false"))
+    conn.execute(text("DELETE FROM reactions"))
+    assert flush(conn) == []
+    assert post_stats(conn, post) == (0, 0)
+
+
+def test_reaction_revision_moves_once_per_statement(conn, users, post):
+    comment = conn.execute(
+        text("INSERT INTO comments (user_id, post_id, content) VALUES (:u, :p, 'hi') RETURNING id"), {"u": users[0], "p": post}
+    ).scalar()
+    conn.execute(
+        text("INSERT INTO reactions (user_id, post_id, comment_id, is_upvote) VALUES (:u, :p, NULL, true), (:u, NULL, :c, true)"),
+        {"u": users[1], "p": post, "c": comment},
+    )
+    conn.execute(text("DELETE FROM reactions WHERE user_id = :u"), {"u": users[1]})
+    revisions = conn.execute(text("SELECT user_id, revision FROM reaction_revisions")).all()
+    assert revisions == [(users[1], 2)]
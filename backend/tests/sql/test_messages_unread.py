@@ -0,0 +1,20 @@
+from sqlalchemy import text
+
+
+def test_marking_messages_seen_updates_unread_counts(conn, users):
+    sender, receiver = users[0], users[1]
+    conn.execute(
+        text("INSERT INTO messages (sender_id, receiver_id, content) SELECT :s, :r, 'hi' FROM generate_series(1, 3)"),
+        {"s": sender, "r": receiver},
+    )
+    ids = conn.execute(text("SELECT id FROM messages ORDER BY id")).scalars().all()
+    for _ in range(2):
+        conn.execute(text("UPDATE messages SET seen = true WHERE id = ANY(:ids)"), {"ids": ids[:2]})
+    unread = conn.execute(
+        text("SELECT unread_count FROM conversations WHERE user_id = :r AND contact_id = :s"), {"r": receiver, "s": sender}
+    ).scalar()
+    counter = conn.execute(text("SELECT unread_messages FROM notification_counters WHERE user_id = :r"), {"r": receiver}).scalar()
+    assert (unread, counter) == (1, 1)
+    assert conn.execute(
+        text("SELECT unread_count FROM conversations WHERE user_id = :s AND contact_id = :r"), {"r": receiver, "s": sender}
+    ).scalar() == 0
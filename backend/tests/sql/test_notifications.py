@@ -0,0 +1,42 @@
+from sqlalchemy import text
+
+
+def notify(conn, recipients, actor, post_id, cap=100):
+    conn.execute(
+        text("SELECT notify_users(:users, :kinds, :actor, :post, NULL, :cap)"),
+        {"users": recipients, "kinds": ["reply"] * len(recipients), "actor": actor, "post": post_id, "cap": cap},
+    )
+
+
+def unread(conn, user_id, column="unread_notifications"):
+    return conn.execute(text(f"SELECT {column} FROM notification_counters WHERE user_id = :u"), {"u": user_id}).scalar()
+
+
+def test_notify_users_skips_actor_and_counts_once(conn, users, post):
+    notify(conn, [users[0], users[0], users[1]], users[1], post)
+    assert conn.execute(text("SELECT user_id FROM notifications")).scalars().all() == [users[0]]
+    assert unread(conn, users[0]) == 1
+    assert unread(conn, users[1]) is None
+
+
+def test_notify_users_prunes_past_cap(conn, users, post):
+    for _ in range(3):
+        notify(conn, [users[0]], users[1], post, cap=2)
+    assert conn.execute(text("SELECT count(*) FROM notifications WHERE user_id = :u"), {"u": users[0]}).scalar() == 2
+    assert unread(conn, users[0]) == 2
+
+
+def test_deleting_post_drops_unread_notifications(conn, users, post):
+    notify(conn, [users[0]], users[1], post)
+    notify(conn, [users[0]], users[1], None)
+    conn.execute(text("DELETE FROM posts WHERE id = :p"), {"p": post})
+    assert unread(conn, users[0]) == 1
+
+
+def test_deleting_sender_drops_unread_messages(conn, users):
+    conn.execute(
+        text("INSERT INTO messages (sender_id, receiver_id, content) VALUES (:a, :b, 'hi'), (:a, :b, 'hi'), (:c, :b, 'hi')"),
+        {"a": users[0], "b": users[1], "c": users[2]},
+    )
+    conn.execute(text("DELETE FROM users WHERE id = :u"), {"u": users[0]})
+    assert unread(conn, users[1], "unread_messages") == 1
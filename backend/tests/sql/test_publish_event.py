@@ -0,0 +1,35 @@
+import json
+import select
+from sqlalchemy import text
+
+
+def publish(conn, channel, data, cap=2):
+    return conn.execute(
+        text("SELECT publish_event(:channel, 'comment', :data, :cap)"), {"channel": channel, "data": data, "cap": cap}
+    ).scalar()
+
+
+def test_publish_event_keeps_the_newest_per_channel(conn):
+    ids = [publish(conn, "post:1", str(i)) for i in range(3)]
+    publish(conn, "post:2", "other")
+    rows = conn.execute(text("SELECT id, data FROM events WHERE channel = 'post:1' ORDER BY id")).all()
+    assert rows == [(ids[1], "1"), (ids[2], "2")]
+
+
+def test_publish_event_notifies_without_oversized_body(engine):
+    listener = engine.raw_connection()
+    try:
+        listener.driver_connection.autocommit = True
+        listener.driver_connection.cursor().execute("LISTEN threaddit_events")
+        with engine.begin() as conn:
+            small = publish(conn, "user:1", '"hi"')
+            large = publish(conn, "user:1", json.dumps("x" * 10000))
+        select.select([listener.driver_connection], [], [], 5)
+        listener.driver_connection.poll()
+        payloads = [json.loads(n.payload) for n in listener.driver_connection.notifies]
+    finally:
+        listener.close()
+    assert payloads == [
+        {"id": small, "channel": "user:1", "event": "comment", "data": '"hi"'},
+        {"id": large, "channel": "user:1", "event": "comment"},
+    ]
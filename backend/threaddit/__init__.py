@@ -4,12 +4,55 @@ from flask_marshmallow import Marshmallow
 from marshmallow import ValidationError
 import cloudinary
 from flask_login import LoginManager
+from threaddit.serialization import FastJSONProvider
+from threaddit.database import RoutingSession, engine_options, replica_binds, stick_to_primary
+from threaddit.media.ingest import UploadRequest
+from werkzeug.exceptions import RequestEntityTooLarge
 from threaddit.config import (
     DATABASE_URI,
+    DATABASE_REPLICA_URIS,
+    DATABASE_POOL_SIZE,
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_TIMEOUT,
+    DATABASE_POOL_RECYCLE,
+    DATABASE_STATEMENT_TIMEOUT,
+    DATABASE_STICKY_SECONDS,
     SECRET_KEY,
     CLOUDINARY_API_SECRET,
     CLOUDINARY_API_KEY,
     CLOUDINARY_NAME,
+    FEED_CACHE_TTL,
+    FEED_CACHE_SIZE,
+    FEED_CACHE_DEPTH,
+    TYPEAHEAD_TTL,
+    CACHE_URL,
+    AUTH_CACHE_TTL,
+    AUTH_CACHE_SIZE,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_SIZE,
+    KARMA_FLUSH_INTERVAL,
+    EVENTS_BROKER,
+    EVENTS_REPLAY_SIZE,
+    EVENTS_HEARTBEAT,
+    NOTIFICATIONS_LIMIT,
+    METRICS_QUERY_BUDGET,
+    METRICS_REPEAT_THRESHOLD,
+    METRICS_TOKEN,
+    MEDIA_STORAGE,
+    MEDIA_WORKERS,
+    MEDIA_SPOOL_DIR,
+    MEDIA_JOB_ATTEMPTS,
+    MEDIA_JOB_TIMEOUT,
+    MEDIA_IMAGE_MAX_SIZE,
+    MEDIA_VIDEO_MAX_SIZE,
+    MEDIA_SPOOL_THRESHOLD,
+    MEDIA_UPLOAD_CHUNK_SIZE,
+    MEDIA_ROOT,
+    MEDIA_URL,
+    MEDIA_VARIANT_WIDTHS,
+    MEDIA_VARIANT_PROCESSES,
+    MEDIA_MAX_AGE,
+    MEDIA_X_SENDFILE,
 )
 
 app = Flask(
@@ -17,6 +60,8 @@ app = Flask(
     static_folder="../../frontend/threaddit/dist",
     static_url_path="/",
 )
+app.json = FastJSONProvider(app)
+app.request_class = UploadRequest
 cloudinary.config(
     cloud_name=CLOUDINARY_NAME,
     api_key=CLOUDINARY_API_KEY,
@@ -24,8 +69,51 @@ cloudinary.config(
 )
 app.config["CLOUDINARY_NAME"] = CLOUDINARY_NAME
 app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URI
+app.config["SQLALCHEMY_BINDS"] = replica_binds(DATABASE_REPLICA_URIS)
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(
+    DATABASE_URI,
+    DATABASE_POOL_SIZE,
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_TIMEOUT,
+    DATABASE_POOL_RECYCLE,
+    DATABASE_STATEMENT_TIMEOUT,
+)
+app.config["DATABASE_STICKY_SECONDS"] = DATABASE_STICKY_SECONDS
 app.config["SECRET_KEY"] = SECRET_KEY
-db = SQLAlchemy(app)
+app.config["FEED_CACHE_TTL"] = FEED_CACHE_TTL
+app.config["FEED_CACHE_SIZE"] = FEED_CACHE_SIZE
+app.config["FEED_CACHE_DEPTH"] = FEED_CACHE_DEPTH
+app.config["TYPEAHEAD_TTL"] = TYPEAHEAD_TTL
+app.config["CACHE_URL"] = CACHE_URL
+app.config["AUTH_CACHE_TTL"] = AUTH_CACHE_TTL
+app.config["AUTH_CACHE_SIZE"] = AUTH_CACHE_SIZE
+app.config["RESPONSE_CACHE_TTL"] = RESPONSE_CACHE_TTL
+app.config["RESPONSE_CACHE_SIZE"] = RESPONSE_CACHE_SIZE
+app.config["KARMA_FLUSH_INTERVAL"] = KARMA_FLUSH_INTERVAL
+app.config["EVENTS_BROKER"] = EVENTS_BROKER
+app.config["EVENTS_REPLAY_SIZE"] = EVENTS_REPLAY_SIZE
+app.config["EVENTS_HEARTBEAT"] = EVENTS_HEARTBEAT
+app.config["NOTIFICATIONS_LIMIT"] = NOTIFICATIONS_LIMIT
+app.config["METRICS_QUERY_BUDGET"] = METRICS_QUERY_BUDGET
+app.config["METRICS_REPEAT_THRESHOLD"] = METRICS_REPEAT_THRESHOLD
+app.config["METRICS_TOKEN"] = METRICS_TOKEN
+app.config["MEDIA_STORAGE"] = MEDIA_STORAGE
+app.config["MEDIA_WORKERS"] = MEDIA_WORKERS
+app.config["MEDIA_SPOOL_DIR"] = MEDIA_SPOOL_DIR
+app.config["MEDIA_JOB_ATTEMPTS"] = MEDIA_JOB_ATTEMPTS
+app.config["MEDIA_JOB_TIMEOUT"] = MEDIA_JOB_TIMEOUT
+app.config["MEDIA_SIZE_LIMITS"] = {"image/": MEDIA_IMAGE_MAX_SIZE, "video/": MEDIA_VIDEO_MAX_SIZE}
+app.config["MEDIA_SPOOL_THRESHOLD"] = MEDIA_SPOOL_THRESHOLD
+app.config["MEDIA_UPLOAD_CHUNK_SIZE"] = MEDIA_UPLOAD_CHUNK_SIZE
+app.config["MAX_CONTENT_LENGTH"] = max(MEDIA_IMAGE_MAX_SIZE, MEDIA_VIDEO_MAX_SIZE) + 1024 * 1024
+app.config["MEDIA_ROOT"] = MEDIA_ROOT
+app.config["MEDIA_URL"] = MEDIA_URL
+app.config["MEDIA_VARIANT_WIDTHS"] = MEDIA_VARIANT_WIDTHS
+app.config["MEDIA_VARIANT_PROCESSES"] = MEDIA_VARIANT_PROCESSES
+app.config["MEDIA_MAX_AGE"] = MEDIA_MAX_AGE
+app.config["USE_X_SENDFILE"] = MEDIA_X_SENDFILE
+db = SQLAlchemy(app, session_options={"class_": RoutingSession})
+app.after_request(stick_to_primary)
 login_manager = LoginManager(app)
 ma = Marshmallow(app)
 
@@ -46,6 +134,11 @@ def handle_marshmallow_validation(err):
     return jsonify({"errors": err.messages}), 400
 
 
+@app.errorhandler(RequestEntityTooLarge)
+def handle_too_large(err):
+    return jsonify({"message": "File too large"}), 413
+
+
 @app.errorhandler(404)
 def not_found(e):
     return app.send_static_file("index.html")
@@ -58,6 +151,14 @@ from threaddit.posts.routes import posts
 from threaddit.comments.routes import comments
 from threaddit.reactions.routes import reactions
 from threaddit.messages.routes import messages
+from threaddit.search.routes import search
+from threaddit.media.routes import media
+from threaddit.events.routes import events
+from threaddit.notifications.routes import notifications
+from threaddit.metrics.routes import metrics
+from threaddit.media.jobs import media_workers
+from threaddit.events.broker import PostgresBroker, broker
+from threaddit import commands
 
 app.register_blueprint(user)
 app.register_blueprint(threads)
@@ -65,3 +166,16 @@ app.register_blueprint(posts)
 app.register_blueprint(comments)
 app.register_blueprint(reactions)
 app.register_blueprint(messages)
+app.register_blueprint(search)
+app.register_blueprint(media)
+app.register_blueprint(events)
+app.register_blueprint(notifications)
+app.register_blueprint(metrics)
+
+# resume jobs left pending or backing off by the previous process
+if MEDIA_WORKERS:
+    media_workers.start()
+
+# listen before the first subscriber arrives so no live event slips past a reconnecting client
+if isinstance(broker, PostgresBroker):
+    broker.start()
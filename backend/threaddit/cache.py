@@ -0,0 +1,172 @@
+import json
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from urllib.parse import urlencode
+from flask import make_response, request
+from flask_login import current_user
+from threaddit import app
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+class MemoryCache:
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    def __init__(self, url, prefix, ttl=60):
+        self.prefix = f"threaddit:{prefix}:"
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key, default=None):
+        value = self._client.get(self.prefix + key)
+        return default if value is None else json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self.prefix + key, json.dumps(value), ex=ttl or self.ttl)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        keys = list(self._client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self._client.delete(*keys)
+
+
+def make_cache(prefix, maxsize=1024, ttl=60):
+    if app.config["CACHE_URL"]:
+        if redis is None:
+            raise Exception("CACHE_URL is set but the redis package is not installed")
+        return RedisCache(app.config["CACHE_URL"], prefix, ttl=ttl)
+    return MemoryCache(maxsize=maxsize, ttl=ttl)
+
+
+class FeedCache:
+    # ranked feeds stay in process, the version lives in the shared store so clear() reaches every worker
+    def __init__(self, entries, versions):
+        self.entries = entries
+        self.versions = versions
+
+    def version(self):
+        version = self.versions.get("version")
+        if version is None:
+            version = time.time_ns()
+            self.versions.set("version", version)
+        return version
+
+    def get(self, key, default=None):
+        return self.entries.get(f"{self.version()}:{key}", default)
+
+    def set(self, key, value, ttl=None):
+        self.entries.set(f"{self.version()}:{key}", value, ttl)
+
+    def clear(self):
+        self.versions.set("version", time.time_ns())
+
+
+class ResponseCache:
+    cached_headers = ("X-Next-Cursor",)
+
+    def __init__(self, store):
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def version(self, tag):
+        version = self.store.get(f"version:{tag}")
+        if version is None:
+            version = time.time_ns()
+            self.store.set(f"version:{tag}", version)
+        return version
+
+    def make_key(self, tags):
+        args = urlencode(sorted(request.args.items(multi=True)))
+        versions = ",".join(f"{tag}={self.version(tag)}" for tag in tags)
+        return f"{request.path}?{args}#{versions}"
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.store.set(f"version:{tag}", time.time_ns())
+        self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0,
+        }
+
+    def cached(self, *tags):
+        def wrapper(func):
+            @wraps(func)
+            def decorated(*args, **kwargs):
+                if current_user.is_authenticated:
+                    return func(*args, **kwargs)
+                key = self.make_key([tag(**kwargs) if callable(tag) else tag for tag in tags])
+                if (cached := self.store.get(key)) is not None:
+                    self.hits += 1
+                    response = app.response_class(cached["body"], mimetype="application/json", headers=cached["headers"])
+                    response.headers["X-Cache"] = "HIT"
+                    return response
+                self.misses += 1
+                response = make_response(func(*args, **kwargs))
+                if response.status_code == 200:
+                    headers = {h: response.headers[h] for h in self.cached_headers if h in response.headers}
+                    self.store.set(key, {"body": response.get_data(as_text=True), "headers": headers})
+                response.headers["X-Cache"] = "MISS"
+                return response
+
+            return decorated
+
+        return wrapper
+
+
+feed_cache = FeedCache(
+    MemoryCache(maxsize=app.config["FEED_CACHE_SIZE"], ttl=app.config["FEED_CACHE_TTL"]),
+    make_cache("feed", ttl=app.config["FEED_CACHE_TTL"]),
+)
+auth_cache = make_cache("auth", maxsize=app.config["AUTH_CACHE_SIZE"], ttl=app.config["AUTH_CACHE_TTL"])
+response_cache = ResponseCache(
+    make_cache("response", maxsize=app.config["RESPONSE_CACHE_SIZE"], ttl=app.config["RESPONSE_CACHE_TTL"])
+)
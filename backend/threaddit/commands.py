@@ -0,0 +1,84 @@
+import click
+import time
+from flask.json.provider import DefaultJSONProvider
+from threaddit import app, db
+from threaddit.comments.models import CommentInfo, serialize_comment
+from threaddit.media.jobs import MediaWorkerPool, process_next_job
+from threaddit.posts.models import PostInfo
+from threaddit.reactions.buffer import flush_karma
+from threaddit.search.utils import SEARCH_TYPES, search_ids, ilike_ids
+
+
+@app.cli.command("reconcile-counters")
+def reconcile_counters():
+    fixed = db.session.execute(db.text("SELECT reconcile_counters()")).scalar()
+    db.session.commit()
+    click.echo(f"Counters reconciled, {fixed} rows corrected")
+
+
+@app.cli.command("refresh-hot-scores")
+def refresh_hot_scores():
+    refreshed = db.session.execute(db.text("SELECT refresh_hot_scores()")).scalar()
+    db.session.commit()
+    click.echo(f"Hot scores refreshed for {refreshed} posts")
+
+
+@app.cli.command("flush-karma")
+def flush_karma_deltas():
+    post_ids = flush_karma()
+    click.echo(f"Karma flushed for {len(post_ids)} posts")
+
+
+@app.cli.command("bench-search")
+@click.argument("search")
+@click.option("--runs", default=20, help="Queries per search type and method.")
+def bench_search(search, runs):
+    for search_type in SEARCH_TYPES:
+        for name, method in (("ilike", ilike_ids), ("fulltext", search_ids)):
+            start = time.perf_counter()
+            for _ in range(runs):
+                count = len(method(search_type, search))
+            elapsed = (time.perf_counter() - start) / runs * 1000
+            click.echo(f"{search_type:<9} {name:<9} {elapsed:8.2f} ms/query  {count} results")
+
+
+@app.cli.command("bench-serialization")
+@click.option("--runs", default=20, help="Iterations per endpoint and method.")
+@click.option("--limit", default=100, help="Posts per feed page.")
+def bench_serialization(runs, limit):
+    legacy = DefaultJSONProvider(app)
+    feed = PostInfo.query.order_by(PostInfo.post_karma.desc(), PostInfo.post_id.desc()).limit(limit)
+    post_id = PostInfo.query.with_entities(PostInfo.post_id).order_by(PostInfo.comments_count.desc()).limit(1).scalar()
+    tree = CommentInfo.query.filter_by(post_id=post_id)
+    endpoints = {
+        "posts": (
+            lambda: legacy.dumps([p.as_dict() for p in feed.all()], separators=(",", ":")),
+            lambda: app.json.dumps(PostInfo.list_as_dict(PostInfo.rows(feed)), separators=(",", ":")),
+        ),
+        "comments": (
+            lambda: legacy.dumps([c.as_dict(None) for c in tree.all()], separators=(",", ":")),
+            lambda: app.json.dumps([serialize_comment(c) for c in CommentInfo.rows(tree)], separators=(",", ":")),
+        ),
+    }
+    for endpoint, methods in endpoints.items():
+        outputs = []
+        for name, method in zip(("orm", "rows"), methods):
+            start = time.perf_counter()
+            for _ in range(runs):
+                outputs.append(method())
+                db.session.expunge_all()
+            elapsed = (time.perf_counter() - start) / runs * 1000
+            click.echo(f"{endpoint:<9} {name:<5} {elapsed:8.2f} ms/request  {len(outputs[-1])} bytes")
+        click.echo(f"{endpoint:<9} output {'identical' if outputs[0] == outputs[-1] else 'DIFFERS'}")
+
+
+@app.cli.command("media-worker")
+@click.option("--once", is_flag=True, help="Drain the queue and exit instead of polling.")
+def media_worker(once):
+    if once:
+        processed = 0
+        while process_next_job():
+            processed += 1
+        click.echo(f"Processed {processed} media jobs")
+        return
+    MediaWorkerPool(size=1).run()
@@ -1,5 +1,10 @@
 from threaddit import db
 from threaddit.reactions.models import Reactions
+from threaddit.cache import response_cache
+from threaddit.events.broker import broker
+from threaddit.notifications.models import Notification
+from sqlalchemy import literal, select
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 
 class Comments(db.Model):
@@ -14,6 +19,7 @@ class Comments(db.Model):
     created_at = db.Column(
         db.DateTime(timezone=True), nullable=False, default=db.func.now()
     )
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed("to_tsvector('english', content)")))
     reaction = db.relationship("Reactions", back_populates="comment")
     user = db.relationship("User", back_populates="comment")
     post = db.relationship("Posts", back_populates="comment")
@@ -30,14 +36,34 @@ class Comments(db.Model):
             new_comment.has_parent = True
             new_comment.parent_id = form_data["parent_id"]
         db.session.add(new_comment)
+        db.session.flush()
+        recipients = new_comment.recipients()
+        Notification.fan_out(recipients, user_id, new_comment.post_id, new_comment.id)
         db.session.commit()
-        return new_comment.comment_info[0].as_dict(user_id)
+        response_cache.invalidate("posts", "threads", f"post:{new_comment.post_id}")
+        comment_info = new_comment.comment_info[0]
+        new_comment.publish(serialize_comment(comment_info), recipients[0][0])
+        return comment_info.as_dict(user_id)
+
+    def publish(self, comment, recipient):
+        event = {"post_id": self.post_id, "comment": comment}
+        broker.publish(f"post:{self.post_id}", "comment", event)
+        if recipient and recipient != self.user_id:
+            broker.publish(f"user:{recipient}", "reply", event)
+
+    def recipients(self):
+        recipients = []
+        if self.parent_id:
+            recipients.append((db.session.query(Comments.user_id).filter_by(id=self.parent_id).scalar(), "reply"))
+        recipients.append((self.post.user_id, "post_comment"))
+        return recipients
 
     def patch(self, content):
         if content:
             self.content = content
             self.is_edited = True
             db.session.commit()
+            response_cache.invalidate(f"post:{self.post_id}")
 
     def __init__(self, user_id, content, post_id=None, has_parent=None, parent_id=None):
         self.user_id = user_id
@@ -62,27 +88,61 @@ class CommentInfo(db.Model):
     post = db.relationship("Posts", back_populates="comment_info")
     comment = db.relationship("Comments", back_populates="comment_info")
 
-    def as_dict(self, cur_user):
-        comment_info = {
-            "user_info": {
-                "user_name": self.user_name,
-                "user_avatar": self.user_avatar,
-            },
-            "comment_info": {
-                "id": self.comment_id,
-                "content": self.content,
-                "created_at": self.created_at,
-                "comment_karma": self.comment_karma,
-                "has_parent": self.has_parent,
-                "is_edited": self.is_edited,
-                "parent_id": self.parent_id,
-            },
-        }
-        if cur_user:
-            has_reaction = Reactions.query.filter_by(
-                comment_id=self.comment_id, user_id=cur_user
-            ).first()
-            comment_info["current_user"] = {
-                "has_upvoted": has_reaction.is_upvote if has_reaction else None
-            }
-        return comment_info
+    @classmethod
+    def get_tree(cls, post_id, parent_id=None, after_id=0, limit=None, max_depth=None):
+        roots = select(Comments.id).where(Comments.post_id == post_id, Comments.id > after_id)
+        roots = roots.where(Comments.parent_id == parent_id if parent_id else Comments.parent_id.is_(None))
+        roots = roots.order_by(Comments.id).limit(limit).subquery()
+        tree = select(roots.c.id, literal(1).label("depth")).cte("comment_tree", recursive=True)
+        children = select(Comments.id, (tree.c.depth + 1).label("depth")).join(tree, Comments.parent_id == tree.c.id)
+        if max_depth:
+            children = children.where(tree.c.depth < max_depth)
+        tree = tree.union_all(children)
+        replies = db.aliased(Comments)
+        has_replies = db.session.query(replies.id).filter(replies.parent_id == tree.c.id).exists()
+        return (
+            db.session.query(*cls.__table__.columns, tree.c.depth, has_replies.label("has_replies"))
+            .join(tree, tree.c.id == cls.comment_id)
+            .order_by(tree.c.depth, cls.comment_id)
+            .all()
+        )
+
+    @classmethod
+    def rows(cls, query):
+        return query.with_entities(*cls.__table__.columns).all()
+
+    def as_dict(self, cur_user, reactions=None):
+        if cur_user and reactions is None:
+            reactions = get_comment_reactions([self.comment_id], cur_user)
+        return serialize_comment(self, reactions if cur_user else None)
+
+
+def serialize_comment(c, reactions=None):
+    comment_info = {
+        "user_info": {
+            "user_name": c.user_name,
+            "user_avatar": c.user_avatar,
+        },
+        "comment_info": {
+            "id": c.comment_id,
+            "content": c.content,
+            "created_at": c.created_at,
+            "comment_karma": c.comment_karma,
+            "has_parent": c.has_parent,
+            "is_edited": c.is_edited,
+            "parent_id": c.parent_id,
+        },
+    }
+    if reactions is not None:
+        comment_info["current_user"] = {"has_upvoted": reactions.get(c.comment_id)}
+    return comment_info
+
+
+def get_comment_reactions(comment_ids, user_id):
+    if not comment_ids:
+        return {}
+    return dict(
+        db.session.query(Reactions.comment_id, Reactions.is_upvote).filter(
+            Reactions.user_id == user_id, Reactions.comment_id.in_(comment_ids)
+        )
+    )
@@ -1,33 +1,39 @@
 from threaddit.comments.models import Comments, CommentInfo
 from threaddit import db
-from threaddit.posts.models import PostInfo
+from threaddit.posts.models import PostInfo, PostStats
 from flask import Blueprint, jsonify, request
 from flask_login import login_required, current_user
-from threaddit.comments.utils import create_comment_tree
+from threaddit.comments.utils import create_comment_tree, encode_token, decode_token
+from threaddit.conditional import conditional
+from threaddit.reactions.models import ReactionRevision
+from threaddit.cache import response_cache
 
 comments = Blueprint("comments", __name__, url_prefix="/api")
 
 
 @comments.route("/comments/post/<pid>", methods=["GET"])
+@conditional(PostStats.get_stamp, ReactionRevision.get_revision)
+@response_cache.cached(lambda pid: f"post:{pid}")
 def get_comments(pid):
-    comments = (
-        CommentInfo.query.filter_by(post_id=pid).order_by(CommentInfo.has_parent.desc(), CommentInfo.comment_id).all()
-    )
-    if not comments:
-        return jsonify({"message": "Invalid Post ID"}), 400
+    limit = request.args.get("limit", default=None, type=int)
+    max_depth = request.args.get("max_depth", default=None, type=int)
+    if limit is not None and limit < 1:
+        return jsonify({"message": "Invalid Request"}), 400
+    cursor = request.args.get("cursor", default=None, type=str)
+    try:
+        parent_id, after_id = decode_token(cursor) if cursor else (None, 0)
+    except Exception:
+        return jsonify({"message": "Invalid Request"}), 400
     cur_user = current_user.id if current_user.is_authenticated else None
-    post_info = PostInfo.query.filter_by(post_id=pid).first()
-    if post_info:
-        return (
-            jsonify(
-                {
-                    "post_info": post_info.as_dict(cur_user),
-                    "comment_info": create_comment_tree(comments=comments, cur_user=cur_user),
-                }
-            ),
-            200,
-        )
-    return jsonify({"message": "Invalid Post ID"}), 400
+    post_info = PostInfo.get_row(pid)
+    if not post_info:
+        return jsonify({"message": "Invalid Post ID"}), 400
+    rows = CommentInfo.get_tree(pid, parent_id=parent_id, after_id=after_id, limit=limit, max_depth=max_depth)
+    comment_tree = create_comment_tree(rows, cur_user=cur_user, max_depth=max_depth)
+    response = jsonify({"post_info": PostInfo.list_as_dict([post_info], cur_user)[0], "comment_info": comment_tree})
+    if limit and len(comment_tree) == limit:
+        response.headers["X-Next-Cursor"] = encode_token(parent_id, comment_tree[-1]["comment"]["comment_info"]["id"])
+    return response, 200
 
 
 @comments.route("/comments/<cid>", methods=["PATCH"])
@@ -51,11 +57,12 @@ def delete_comment(cid):
     elif comment.user_id == current_user.id or current_user.has_role("admin"):
         Comments.query.filter_by(id=cid).delete()
         db.session.commit()
+        response_cache.invalidate("posts", "threads", f"post:{comment.post_id}")
         return jsonify({"message": "Comment deleted"}), 200
-    current_user_mod_in = [r.subthread_id for r in current_user.user_role if r.role.slug == "mod"]
-    if comment.post.subthread_id in current_user_mod_in:
+    if current_user.moderates(comment.post.subthread_id):
         Comments.query.filter_by(id=cid).delete()
         db.session.commit()
+        response_cache.invalidate("posts", "threads", f"post:{comment.post_id}")
         return jsonify({"message": "Comment deleted"}), 200
     return jsonify({"message": "Unauthorized"}), 401
 
@@ -1,15 +1,36 @@
-def create_comment_tree(comments, cur_user=None):
-    if not comments[0]:
-        return []
+import json
+import base64
+from threaddit.comments.models import get_comment_reactions, serialize_comment
+
+
+def encode_token(parent_id, after_id):
+    payload = json.dumps([parent_id, after_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_token(token):
+    try:
+        parent_id, after_id = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise Exception("Invalid Token")
+    if not isinstance(after_id, int) or not (parent_id is None or isinstance(parent_id, int)):
+        raise Exception("Invalid Token")
+    return parent_id, after_id
+
+
+def create_comment_tree(rows, cur_user=None, max_depth=None):
+    reactions = get_comment_reactions([c.comment_id for c in rows], cur_user) if cur_user else None
     comment_dict = {}
     root_comments = []
 
-    for comment in comments:
-        comment_data = {"comment": comment.as_dict(cur_user), "children": []}
+    for comment in rows:
+        comment_data = {"comment": serialize_comment(comment, reactions), "children": []}
         comment_dict[comment.comment_id] = comment_data
 
-        if not comment.has_parent:
+        if comment.depth == 1:
             root_comments.append(comment_data)
-        elif comment.parent_id in comment_dict:
+        else:
             comment_dict[comment.parent_id]["children"].append(comment_data)
+        if comment.has_replies and comment.depth == max_depth:
+            comment_data["more_replies"] = encode_token(comment.comment_id, 0)
     return root_comments
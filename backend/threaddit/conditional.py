@@ -0,0 +1,42 @@
+import hashlib
+from functools import wraps
+from flask import make_response, request
+from flask_login import current_user
+from werkzeug.http import is_resource_modified
+from threaddit import app
+
+
+def make_etag(revision):
+    viewer = current_user.id if current_user.is_authenticated else 0
+    return hashlib.blake2b(f"{request.full_path}:{revision}:{viewer}".encode(), digest_size=12).hexdigest()
+
+
+def conditional(get_stamp, get_viewer_revision=None):
+    def wrapper(func):
+        @wraps(func)
+        def decorated(*args, **kwargs):
+            stamp = get_stamp(*args, **kwargs)
+            if stamp is None:
+                return func(*args, **kwargs)
+            revision, updated_at = stamp
+            if get_viewer_revision and current_user.is_authenticated:
+                # the viewer's own votes are in the body but only move the shared revision on the next flush
+                revision = f"{revision}.{get_viewer_revision(current_user.id)}"
+            etag = make_etag(revision)
+            # only the ETag decides: Last-Modified has one-second resolution and knows nothing of the viewer
+            if is_resource_modified(request.environ, etag=etag):
+                response = make_response(func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            else:
+                response = app.response_class(status=304)
+            response.set_etag(etag, weak=True)
+            if not current_user.is_authenticated:
+                response.last_modified = updated_at
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+
+        return decorated
+
+    return wrapper
@@ -1,7 +1,47 @@
+import os
 from dotenv import dotenv_values
 
 DATABASE_URI = dotenv_values()["DATABASE_URI"]
+DATABASE_REPLICA_URIS = [uri for uri in dotenv_values().get("DATABASE_REPLICA_URIS", "").split(",") if uri]
+DATABASE_POOL_SIZE = int(dotenv_values().get("DATABASE_POOL_SIZE", 5))
+DATABASE_MAX_OVERFLOW = int(dotenv_values().get("DATABASE_MAX_OVERFLOW", 10))
+DATABASE_POOL_TIMEOUT = int(dotenv_values().get("DATABASE_POOL_TIMEOUT", 10))
+DATABASE_POOL_RECYCLE = int(dotenv_values().get("DATABASE_POOL_RECYCLE", 1800))
+DATABASE_STATEMENT_TIMEOUT = int(dotenv_values().get("DATABASE_STATEMENT_TIMEOUT", 30000))
+DATABASE_STICKY_SECONDS = int(dotenv_values().get("DATABASE_STICKY_SECONDS", 5))
 SECRET_KEY = dotenv_values()["SECRET_KEY"]
 CLOUDINARY_NAME = dotenv_values()["CLOUDINARY_NAME"]
 CLOUDINARY_API_KEY = dotenv_values()["CLOUDINARY_API_KEY"]
 CLOUDINARY_API_SECRET = dotenv_values()["CLOUDINARY_API_SECRET"]
+FEED_CACHE_TTL = int(dotenv_values().get("FEED_CACHE_TTL", 60))
+FEED_CACHE_SIZE = int(dotenv_values().get("FEED_CACHE_SIZE", 1024))
+FEED_CACHE_DEPTH = int(dotenv_values().get("FEED_CACHE_DEPTH", 500))
+TYPEAHEAD_TTL = int(dotenv_values().get("TYPEAHEAD_TTL", 300))
+CACHE_URL = dotenv_values().get("CACHE_URL")
+AUTH_CACHE_TTL = int(dotenv_values().get("AUTH_CACHE_TTL", 300))
+AUTH_CACHE_SIZE = int(dotenv_values().get("AUTH_CACHE_SIZE", 10000))
+RESPONSE_CACHE_TTL = int(dotenv_values().get("RESPONSE_CACHE_TTL", 30))
+RESPONSE_CACHE_SIZE = int(dotenv_values().get("RESPONSE_CACHE_SIZE", 2048))
+KARMA_FLUSH_INTERVAL = int(dotenv_values().get("KARMA_FLUSH_INTERVAL", 250))
+EVENTS_BROKER = dotenv_values().get("EVENTS_BROKER", "postgres")
+EVENTS_REPLAY_SIZE = int(dotenv_values().get("EVENTS_REPLAY_SIZE", 100))
+EVENTS_HEARTBEAT = int(dotenv_values().get("EVENTS_HEARTBEAT", 15))
+NOTIFICATIONS_LIMIT = int(dotenv_values().get("NOTIFICATIONS_LIMIT", 100))
+METRICS_QUERY_BUDGET = int(dotenv_values().get("METRICS_QUERY_BUDGET", 0))
+METRICS_REPEAT_THRESHOLD = int(dotenv_values().get("METRICS_REPEAT_THRESHOLD", 5))
+METRICS_TOKEN = dotenv_values().get("METRICS_TOKEN")
+MEDIA_STORAGE = dotenv_values().get("MEDIA_STORAGE", "cloudinary")
+MEDIA_WORKERS = int(dotenv_values().get("MEDIA_WORKERS", 2))
+MEDIA_SPOOL_DIR = dotenv_values().get("MEDIA_SPOOL_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "spool"))
+MEDIA_JOB_ATTEMPTS = int(dotenv_values().get("MEDIA_JOB_ATTEMPTS", 5))
+MEDIA_JOB_TIMEOUT = int(dotenv_values().get("MEDIA_JOB_TIMEOUT", 600))
+MEDIA_IMAGE_MAX_SIZE = int(dotenv_values().get("MEDIA_IMAGE_MAX_SIZE", 10 * 1024 * 1024))
+MEDIA_VIDEO_MAX_SIZE = int(dotenv_values().get("MEDIA_VIDEO_MAX_SIZE", 500 * 1024 * 1024))
+MEDIA_SPOOL_THRESHOLD = int(dotenv_values().get("MEDIA_SPOOL_THRESHOLD", 1024 * 1024))
+MEDIA_UPLOAD_CHUNK_SIZE = int(dotenv_values().get("MEDIA_UPLOAD_CHUNK_SIZE", 20 * 1024 * 1024))
+MEDIA_ROOT = dotenv_values().get("MEDIA_ROOT", os.path.join(os.path.dirname(os.path.dirname(__file__)), "media"))
+MEDIA_URL = dotenv_values().get("MEDIA_URL", "/media")
+MEDIA_VARIANT_WIDTHS = [int(w) for w in dotenv_values().get("MEDIA_VARIANT_WIDTHS", "320,640,1280").split(",") if w]
+MEDIA_VARIANT_PROCESSES = int(dotenv_values().get("MEDIA_VARIANT_PROCESSES", 2))
+MEDIA_MAX_AGE = int(dotenv_values().get("MEDIA_MAX_AGE", 365 * 24 * 60 * 60))
+MEDIA_X_SENDFILE = dotenv_values().get("MEDIA_X_SENDFILE", "false").lower() == "true"
@@ -0,0 +1,59 @@
+import random
+import time
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+READ_METHODS = ("GET", "HEAD")
+
+
+def engine_options(uri, pool_size, max_overflow, pool_timeout, pool_recycle, statement_timeout):
+    options = {"pool_pre_ping": True, "pool_recycle": pool_recycle}
+    if uri.startswith("postgres"):
+        options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+        if statement_timeout:
+            options["connect_args"] = {"options": f"-c statement_timeout={statement_timeout}"}
+    return options
+
+
+def replica_binds(uris):
+    return {f"replica_{i}": uri for i, uri in enumerate(uris)}
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.use_replica(clause):
+            return self._db.engines[g.db_replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def use_replica(self, clause):
+        if self._flushing or not has_request_context() or request.method not in READ_METHODS:
+            return False
+        if not getattr(clause, "is_select", False) or getattr(clause, "_for_update_arg", None) is not None:
+            return False
+        if g.get("db_wrote") or session.get("db_primary_until", 0) > time.time():
+            return False
+        if "db_replica" not in g:
+            replicas = [key for key in self._db.engines if key and key.startswith("replica_")]
+            g.db_replica = random.choice(replicas) if replicas else None
+        return g.db_replica is not None
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def mark_flush(db_session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def mark_dml(orm_execute_state):
+    if has_request_context() and (
+        orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete
+    ):
+        g.db_wrote = True
+
+
+def stick_to_primary(response):
+    if g.get("db_wrote") and current_app.config["SQLALCHEMY_BINDS"]:
+        session["db_primary_until"] = time.time() + current_app.config["DATABASE_STICKY_SECONDS"]
+    return response
@@ -0,0 +1,242 @@
+import json
+import os
+import select
+import time
+from collections import OrderedDict, deque
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from threaddit import app, db
+
+CLOSED = object()
+
+
+class Subscription:
+    def __init__(self, channels, maxsize=256):
+        self.channels = channels
+        self._queue = Queue(maxsize)
+        self._lock = Lock()
+        self._held = None
+
+    def hold(self):
+        self._held = []
+
+    def release(self, replay):
+        # live events that arrived while the replay was loading go after it, minus any it already covered
+        with self._lock:
+            held, self._held = self._held, None
+            replayed = {item[0] for item in replay}
+            for item in replay + [item for item in held if item[0] not in replayed]:
+                self._put(item)
+
+    def put(self, item):
+        with self._lock:
+            if self._held is not None:
+                self._held.append(item)
+                return
+        self._put(item)
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+        except Full:
+            # a client this far behind reconnects and catches up through the replay buffer
+            self.close()
+
+    def close(self):
+        while True:
+            try:
+                self._queue.put_nowait(CLOSED)
+                return
+            except Full:
+                try:
+                    self._queue.get_nowait()
+                except Empty:
+                    pass
+
+    def get(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+
+class MemoryBroker:
+    def __init__(self, replay_size=100, max_channels=10000):
+        self.replay_size = replay_size
+        self.max_channels = max_channels
+        self._last_id = 0
+        self._lock = Lock()
+        self._subscribers = {}
+        self._history = OrderedDict()
+
+    def publish(self, channel, event, data):
+        with self._lock:
+            self._last_id += 1
+            event_id = self._last_id
+        self.dispatch(event_id, channel, event, app.json.dumps(data, separators=(",", ":")))
+
+    def dispatch(self, event_id, channel, event, data):
+        item = (event_id, event, data)
+        with self._lock:
+            history = self._history.get(channel)
+            if history is None:
+                history = self._history[channel] = deque(maxlen=self.replay_size)
+                while len(self._history) > self.max_channels:
+                    self._history.popitem(last=False)
+            else:
+                self._history.move_to_end(channel)
+            history.append(item)
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(item)
+
+    def subscribe(self, channels, last_event_id=None):
+        subscription = Subscription(channels)
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+            replay = []
+            if last_event_id is not None:
+                replay = sorted(
+                    item for channel in channels for item in self._history.get(channel, ()) if item[0] > last_event_id
+                )
+        for item in replay:
+            subscription.put(item)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+
+class PostgresBroker(MemoryBroker):
+    channel = "threaddit_events"
+
+    def __init__(self, replay_size=100, max_channels=10000):
+        super().__init__(replay_size, max_channels)
+        self._pid = None
+        self._last_seen = None
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def publish(self, channel, event, data):
+        # its own connection, so publishing never commits whatever the caller has pending
+        with db.engine.begin() as conn:
+            conn.execute(
+                db.text("SELECT publish_event(:channel, :event, :data, :cap)"),
+                {
+                    "channel": channel,
+                    "event": event,
+                    "data": app.json.dumps(data, separators=(",", ":")),
+                    "cap": self.replay_size,
+                },
+            )
+
+    def dispatch(self, event_id, channel, event, data):
+        # replay comes from the events table, every worker sees the same history
+        item = (event_id, event, data)
+        with self._lock:
+            self._last_seen = max(self._last_seen or 0, event_id)
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(item)
+
+    def subscribe(self, channels, last_event_id=None):
+        subscription = Subscription(channels)
+        if last_event_id is not None:
+            subscription.hold()
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        if last_event_id is not None:
+            try:
+                subscription.release(self.load(channels, last_event_id))
+            except Exception:
+                self.unsubscribe(subscription)
+                raise
+        return subscription
+
+    def load(self, channels, last_event_id):
+        with db.engine.connect() as conn:
+            rows = conn.execute(
+                db.text(
+                    "SELECT id, event, data FROM events WHERE channel = ANY(:channels) AND id > :last_event_id ORDER BY id"
+                ),
+                {"channels": list(channels), "last_event_id": last_event_id},
+            )
+            return [tuple(row) for row in rows]
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        Thread(target=self.run, daemon=True).start()
+
+    def after_fork(self):
+        # the listener thread does not survive a fork, e.g. gunicorn --preload
+        self._lock = Lock()
+        if self._pid is not None:
+            self.start()
+
+    def run(self):
+        while True:
+            try:
+                with app.app_context():
+                    connection = db.engine.raw_connection()
+                # detaching drops the pool's reference to the driver connection, so take it first
+                driver_connection = connection.driver_connection
+                connection.detach()
+                self.listen(driver_connection)
+            except Exception:
+                app.logger.exception("Event listener failed, reconnecting")
+                time.sleep(1)
+
+    def listen(self, conn):
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel}")
+                if self._last_seen is not None:
+                    # catch up on whatever was published while the listener was reconnecting
+                    cursor.execute(
+                        "SELECT id, channel, event, data FROM events WHERE id > %s ORDER BY id", (self._last_seen,)
+                    )
+                    for row in cursor.fetchall():
+                        self.dispatch(*row)
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    payload = json.loads(conn.notifies.pop(0).payload)
+                    if payload["id"] <= (self._last_seen or 0):
+                        # already dispatched by the catch-up above, ids arrive in commit order
+                        continue
+                    if "data" not in payload:
+                        with conn.cursor() as cursor:
+                            cursor.execute("SELECT data FROM events WHERE id = %s", (payload["id"],))
+                            row = cursor.fetchone()
+                        payload["data"] = row[0] if row else "null"
+                    self.dispatch(payload["id"], payload["channel"], payload["event"], payload["data"])
+        finally:
+            conn.close()
+
+
+def make_broker(name):
+    match name:
+        case "postgres":
+            return PostgresBroker(app.config["EVENTS_REPLAY_SIZE"])
+        case "memory":
+            return MemoryBroker(app.config["EVENTS_REPLAY_SIZE"])
+        case _:
+            raise Exception(f"Unknown event broker {name}")
+
+
+broker = make_broker(app.config["EVENTS_BROKER"])
@@ -0,0 +1,44 @@
+from flask import Blueprint, Response, jsonify, request
+from flask_login import current_user
+from threaddit import app
+from threaddit.events.broker import CLOSED, broker
+
+events = Blueprint("events", __name__, url_prefix="/api")
+
+MAX_POST_CHANNELS = 20
+
+
+def format_event(item):
+    event_id, event, data = item
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+@events.route("/events", methods=["GET"])
+def stream_events():
+    post_ids = [p for p in request.args.get("posts", default="", type=str).split(",") if p.isdigit()]
+    channels = [f"post:{post_id}" for post_id in post_ids[:MAX_POST_CHANNELS]]
+    if current_user.is_authenticated:
+        channels.append(f"user:{current_user.id}")
+    if not channels:
+        return jsonify({"message": "Nothing to subscribe to"}), 400
+    last_event_id = request.headers.get("Last-Event-ID", default=None, type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get("last_event_id", default=None, type=int)
+    subscription = broker.subscribe(channels, last_event_id)
+    heartbeat = app.config["EVENTS_HEARTBEAT"]
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                item = subscription.get(timeout=heartbeat)
+                if item is CLOSED:
+                    return
+                yield format_event(item) if item else ": keepalive\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = Response(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,61 @@
+import io
+import os
+import tempfile
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+
+
+def get_size_limit(content_type):
+    for prefix, limit in current_app.config["MEDIA_SIZE_LIMITS"].items():
+        if content_type and content_type.startswith(prefix):
+            return limit
+    return current_app.config["MEDIA_SIZE_LIMITS"]["image/"]
+
+
+class UploadBuffer:
+    def __init__(self, limit, threshold, directory):
+        self.limit = limit
+        self.threshold = threshold
+        self.directory = directory
+        self.size = 0
+        self.path = None
+        self._file = io.BytesIO()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.limit:
+            self.close()
+            raise RequestEntityTooLarge(f"Upload exceeds the {self.limit} byte limit")
+        if self.path is None and self.size > self.threshold:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, self.path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+            spooled = os.fdopen(fd, "w+b")
+            spooled.write(self._file.getbuffer())
+            self._file = spooled
+        return self._file.write(data)
+
+    def move_to(self, path):
+        self._file.flush()
+        os.replace(self.path, path)
+        self.path = None
+
+    def close(self):
+        self._file.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    max_form_memory_size = 1024 * 1024
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        limit = get_size_limit(content_type)
+        if content_length is not None and content_length > limit:
+            raise RequestEntityTooLarge(f"Upload exceeds the {limit} byte limit")
+        return UploadBuffer(limit, current_app.config["MEDIA_SPOOL_THRESHOLD"], current_app.config["MEDIA_SPOOL_DIR"])
@@ -0,0 +1,240 @@
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from threading import Event, Lock, Thread
+from werkzeug.utils import secure_filename
+from threaddit import app, db
+from threaddit.cache import response_cache
+from threaddit.media.storage import storage
+
+# table -> (media column, extra values written when the upload lands)
+TARGETS = {
+    "posts": ("media", {"media_state": "ready"}),
+    "subthreads": ("logo", {}),
+    "users": ("avatar", {}),
+}
+
+
+class MediaJob(db.Model):
+    __tablename__ = "media_jobs"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    kind = db.Column(db.Text, nullable=False)
+    target = db.Column(db.Text)
+    target_id = db.Column(db.Integer)
+    path = db.Column(db.Text)
+    public_id = db.Column(db.Text)
+    resource_type = db.Column(db.Text)
+    transformation = db.Column(db.Text)
+    content_type = db.Column(db.Text)
+    url = db.Column(db.Text)
+    status = db.Column(db.Text, nullable=False, default="pending")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    run_at = db.Column(db.DateTime(timezone=True), nullable=False, default=db.func.now())
+    locked_at = db.Column(db.DateTime(timezone=True))
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False, default=db.func.now())
+
+
+def spool(file):
+    os.makedirs(app.config["MEDIA_SPOOL_DIR"], exist_ok=True)
+    path = os.path.join(app.config["MEDIA_SPOOL_DIR"], uuid.uuid4().hex)
+    if getattr(file.stream, "path", None):
+        file.stream.move_to(path)
+    else:
+        file.save(path)
+    return path
+
+
+def remove_spool(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def enqueue_upload(target, target_id, file, transformation):
+    supersede_uploads(target, target_id)
+    filename = secure_filename(file.filename)
+    db.session.add(
+        MediaJob(
+            kind="upload",
+            target=target,
+            target_id=target_id,
+            path=spool(file),
+            public_id=f"{uuid.uuid4().hex}_{filename.rsplit('.')[0]}",
+            resource_type="video" if file.content_type.startswith("video/") else "image",
+            transformation=transformation,
+            content_type=file.content_type,
+        )
+    )
+    media_workers.start()
+
+
+def enqueue_destroy(url):
+    if url and storage.owns(url):
+        db.session.add(MediaJob(kind="destroy", url=url))
+        media_workers.start()
+
+
+def supersede_uploads(target, target_id):
+    for job in MediaJob.query.filter_by(kind="upload", target=target, target_id=target_id).filter(
+        MediaJob.status.in_(("pending", "running"))
+    ):
+        if job.status == "pending":
+            remove_spool(job.path)
+            db.session.delete(job)
+        else:
+            job.status = "cancelled"
+
+
+def claim_job():
+    timeout = datetime.now(timezone.utc) - timedelta(seconds=app.config["MEDIA_JOB_TIMEOUT"])
+    job = (
+        MediaJob.query.filter(
+            db.or_(
+                db.and_(MediaJob.status == "pending", MediaJob.run_at <= db.func.now()),
+                db.and_(MediaJob.status == "running", MediaJob.locked_at < timeout),
+            )
+        )
+        .order_by(MediaJob.run_at, MediaJob.id)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if job:
+        job.status = "running"
+        job.attempts += 1
+        job.locked_at = db.func.now()
+        db.session.commit()
+    return job
+
+
+def apply_upload(job, url):
+    db.session.refresh(job, with_for_update=True)
+    target, target_id, path = job.target, job.target_id, job.path
+    applied = 0
+    if job.status == "running":
+        column, values = TARGETS[target]
+        table = db.metadata.tables[target]
+        replaced = db.session.execute(
+            db.select(table.c[column]).where(table.c.id == target_id).with_for_update()
+        ).scalar()
+        applied = db.session.execute(
+            table.update().where(table.c.id == target_id).values({column: url, **values})
+        ).rowcount
+        enqueue_destroy(replaced)
+    if not applied:
+        enqueue_destroy(url)
+    db.session.delete(job)
+    db.session.commit()
+    remove_spool(path)
+    if applied:
+        invalidate_target(target, target_id)
+
+
+def fail_upload(job):
+    enqueue_destroy(job.url)
+    if job.target == "posts":
+        table = db.metadata.tables["posts"]
+        db.session.execute(table.update().where(table.c.id == job.target_id).values(media_state="failed"))
+        invalidate_target(job.target, job.target_id)
+    remove_spool(job.path)
+
+
+def is_referenced(url):
+    for target, (column, _) in TARGETS.items():
+        table = db.metadata.tables[target]
+        if db.session.execute(db.select(table.c.id).where(table.c[column] == url).limit(1)).first():
+            return True
+    return False
+
+
+def invalidate_target(target, target_id):
+    match target:
+        case "posts":
+            response_cache.invalidate("posts", f"post:{target_id}")
+        case "subthreads":
+            response_cache.invalidate("threads", "posts")
+
+
+def run_job(job):
+    if job.kind == "upload":
+        if not job.url:
+            # kept on the job so a retry after a database error does not upload again,
+            # and a job that gives up can remove what it stored
+            job.url = storage.upload(job.path, job.public_id, job.resource_type, job.transformation, job.content_type)
+            db.session.commit()
+        apply_upload(job, job.url)
+    else:
+        if not is_referenced(job.url):
+            storage.destroy(job.url)
+        db.session.delete(job)
+        db.session.commit()
+
+
+def process_next_job():
+    job = claim_job()
+    if job is None:
+        return False
+    job_id = job.id
+    try:
+        run_job(job)
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(MediaJob, job_id)
+        if job is None:
+            # the job committed its work and removed itself before the failure, e.g. in cache invalidation
+            app.logger.exception("Media job %s failed after it finished", job_id)
+            return True
+        job.last_error = str(e)
+        if job.status == "cancelled":
+            enqueue_destroy(job.url)
+            remove_spool(job.path)
+            db.session.delete(job)
+        elif job.attempts >= app.config["MEDIA_JOB_ATTEMPTS"]:
+            job.status = "failed"
+            if job.kind == "upload":
+                fail_upload(job)
+        else:
+            job.status = "pending"
+            job.run_at = datetime.now(timezone.utc) + timedelta(seconds=2**job.attempts)
+        db.session.commit()
+    return True
+
+
+class MediaWorkerPool:
+    def __init__(self, size, poll_interval=1):
+        self.size = size
+        self.poll_interval = poll_interval
+        self._pid = None
+        self._lock = Lock()
+        self._wake = Event()
+        os.register_at_fork(after_in_child=self.after_fork)
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for _ in range(self.size):
+                Thread(target=self.run, daemon=True).start()
+        self._wake.set()
+
+    def after_fork(self):
+        # threads do not survive a fork, e.g. gunicorn --preload
+        self._lock = Lock()
+        if self._pid is not None:
+            self.start()
+
+    def run(self):
+        while True:
+            with app.app_context():
+                try:
+                    busy = process_next_job()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception("Media worker failed")
+                    busy = False
+            if not busy:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+
+media_workers = MediaWorkerPool(app.config["MEDIA_WORKERS"])
@@ -0,0 +1,20 @@
+from flask import Blueprint, jsonify, request, send_from_directory
+from werkzeug.exceptions import NotFound
+from threaddit import app
+from threaddit.media.storage import LocalStorage, storage
+
+media = Blueprint("media", __name__, url_prefix="/media")
+
+
+@media.route("/<path:filename>", methods=["GET"])
+def send_image(filename):
+    if not isinstance(storage, LocalStorage):
+        return jsonify({"message": "Media not found"}), 404
+    filename = storage.resolve(filename, request.args.get("w", type=int))
+    try:
+        response = send_from_directory(storage.root, filename, max_age=app.config["MEDIA_MAX_AGE"])
+    except NotFound:
+        return jsonify({"message": "Media not found"}), 404
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
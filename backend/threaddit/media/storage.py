@@ -0,0 +1,126 @@
+import hashlib
+import mimetypes
+import os
+import shutil
+import uuid
+import cloudinary.uploader as uploader
+from werkzeug.security import safe_join
+from threaddit import app
+from threaddit.media.variants import VariantPool, variant_path
+
+
+class CloudinaryStorage:
+    def __init__(self, cloud_name):
+        self.base_url = f"https://res.cloudinary.com/{cloud_name}"
+
+    def upload(self, path, public_id, resource_type="image", transformation="", content_type=None):
+        data = uploader.upload_large(
+            path, public_id=public_id, resource_type=resource_type, chunk_size=app.config["MEDIA_UPLOAD_CHUNK_SIZE"]
+        )
+        if resource_type == "video":
+            return data.get("playback_url")
+        return f"{self.base_url}/image/upload/{transformation}/{data.get('public_id')}"
+
+    def owns(self, url):
+        return url.startswith(self.base_url)
+
+    def destroy(self, url):
+        res = uploader.destroy(url.split("/")[-1])
+        print(f"Cloudinary Image Destory Response for {url}: ", res)
+
+
+class FakeStorage:
+    base_url = "https://fake.media"
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.uploads = []
+        self.destroyed = []
+
+    def upload(self, path, public_id, resource_type="image", transformation="", content_type=None):
+        if self.failures > 0:
+            self.failures -= 1
+            raise Exception("Fake upload failure")
+        url = f"{self.base_url}/{resource_type}/{transformation}/{public_id}"
+        self.uploads.append((path, url))
+        return url
+
+    def owns(self, url):
+        return url.startswith(self.base_url)
+
+    def destroy(self, url):
+        self.destroyed.append(url)
+
+
+class LocalStorage:
+    def __init__(self, root, base_url, widths, processes):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+        self.widths = sorted(widths)
+        self.variants = VariantPool(processes)
+
+    def upload(self, path, public_id, resource_type="image", transformation="", content_type=None):
+        digest = file_digest(path)
+        name = f"{digest[:2]}/{digest}{mimetypes.guess_extension(content_type or '') or ''}"
+        target = os.path.join(self.root, name)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.{uuid.uuid4().hex}.part"
+            shutil.copyfile(path, tmp)
+            os.replace(tmp, target)
+        if resource_type == "image":
+            try:
+                self.variants.generate(target, self.widths)
+            except Exception:
+                # the original is still served, just without resized variants
+                app.logger.exception("Could not generate variants for %s", name)
+        return f"{self.base_url}/{name}"
+
+    def owns(self, url):
+        return url.startswith(f"{self.base_url}/")
+
+    def resolve(self, filename, width=None):
+        if width:
+            for w in self.widths:
+                if w >= width:
+                    variant = variant_path(filename, w)
+                    if os.path.exists(os.path.join(self.root, variant)):
+                        return variant
+                    break
+        return filename
+
+    def destroy(self, url):
+        path = safe_join(self.root, url[len(self.base_url) + 1 :])
+        if path is None:
+            return
+        for file in [path, *(variant_path(path, w) for w in self.widths)]:
+            if os.path.exists(file):
+                os.remove(file)
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_storage(name):
+    match name:
+        case "cloudinary":
+            return CloudinaryStorage(app.config["CLOUDINARY_NAME"])
+        case "local":
+            return LocalStorage(
+                app.config["MEDIA_ROOT"],
+                app.config["MEDIA_URL"],
+                app.config["MEDIA_VARIANT_WIDTHS"],
+                app.config["MEDIA_VARIANT_PROCESSES"],
+            )
+        case "fake":
+            return FakeStorage()
+        case _:
+            raise Exception(f"Unknown media storage {name}")
+
+
+storage = make_storage(app.config["MEDIA_STORAGE"])
@@ -0,0 +1,56 @@
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+
+def variant_path(path, width):
+    return f"{os.path.splitext(path)[0]}_{width}.webp"
+
+
+def make_variants(path, widths):
+    made = []
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if img.mode in ("LA", "PA") or "transparency" in img.info else "RGB")
+        for width in sorted(widths):
+            if width >= img.width:
+                break
+            target = variant_path(path, width)
+            if not os.path.exists(target):
+                tmp = f"{target}.{uuid.uuid4().hex}.part"
+                img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS).save(
+                    tmp, format="WEBP", quality=80
+                )
+                os.replace(tmp, target)
+            made.append(width)
+    return made
+
+
+class VariantPool:
+    def __init__(self, processes):
+        self.processes = processes
+        self._executor = None
+        self._lock = Lock()
+
+    def generate(self, path, widths):
+        if Image is None or not widths:
+            return []
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.processes)
+            executor = self._executor
+        try:
+            return executor.submit(make_variants, path, widths).result()
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            raise
@@ -1,5 +1,5 @@
 from threaddit import db
-from sqlalchemy import case, func
+from sqlalchemy.orm import joinedload
 
 
 class Messages(db.Model):
@@ -41,34 +41,62 @@ class Messages(db.Model):
         }
 
     @classmethod
-    def get_inbox(cls, user_id):
-        my_case = case(
-            (Messages.sender_id == user_id, Messages.receiver_id),
-            else_=Messages.sender_id,
-        ).label("contact_id")
-        my_max = func.max(Messages.id).label("latest_id")
-        my_subquery = (
-            db.session.query(my_case, my_max)
-            .filter((Messages.sender_id == user_id) | (Messages.receiver_id == user_id))
-            .group_by("contact_id")
-            .subquery()
+    def get_inbox(cls, user_id, limit=20, cursor=None):
+        query = (
+            Conversation.query.filter(Conversation.user_id == user_id)
+            .options(
+                joinedload(Conversation.last_message).joinedload(Messages.user_sender),
+                joinedload(Conversation.last_message).joinedload(Messages.user_receiver),
+            )
+            .order_by(Conversation.last_message_id.desc())
         )
-        messages = (
-            Messages.query.join(my_subquery, my_subquery.c.latest_id == Messages.id)
-            .order_by(Messages.created_at.desc())
-            .all()
+        if cursor:
+            query = query.filter(Conversation.last_message_id < cursor)
+        return [c.as_dict() for c in query.limit(limit)]
+
+    @classmethod
+    def get_conversation(cls, user_id, contact_id, limit=50, cursor=None):
+        def newest(sender_id, receiver_id):
+            query = db.select(Messages.id).filter(Messages.sender_id == sender_id, Messages.receiver_id == receiver_id)
+            if cursor:
+                query = query.filter(Messages.id < cursor)
+            return query.order_by(Messages.id.desc()).limit(limit)
+
+        # one backward scan of messages_sender_receiver_idx per direction instead of sorting the whole conversation
+        ids = db.union_all(newest(user_id, contact_id), newest(contact_id, user_id)).subquery()
+        return (
+            Messages.query.filter(Messages.id.in_(db.select(ids.c.id)))
+            .options(joinedload(Messages.user_sender), joinedload(Messages.user_receiver))
+            .order_by(Messages.id.desc())
+            .limit(limit)
+            .all()[::-1]
         )
-        messages_list = []
-        for message in messages:
-            sender = message.user_receiver if message.sender_id == user_id else message.user_sender
-            messages_list.append(
-                message.as_dict()
-                | {
-                    "latest_from_user": message.sender_id == user_id,
-                    "sender": {
-                        "username": sender.username,
-                        "avatar": sender.avatar,
-                    },
-                }
-            )
-        return messages_list
+
+    @classmethod
+    def mark_seen(cls, user_id, contact_id):
+        seen = Messages.query.filter(
+            Messages.receiver_id == user_id, Messages.sender_id == contact_id, Messages.seen == False
+        ).update({"seen": True, "seen_at": db.func.now()}, synchronize_session=False)
+        db.session.commit()
+        return seen
+
+
+class Conversation(db.Model):
+    __tablename__ = "conversations"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    contact_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    last_message_id = db.Column(db.Integer, db.ForeignKey("messages.id"), nullable=False)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+    last_message = db.relationship("Messages")
+
+    def as_dict(self):
+        message = self.last_message
+        contact = message.user_receiver if message.sender_id == self.user_id else message.user_sender
+        return message.as_dict() | {
+            "latest_from_user": message.sender_id == self.user_id,
+            "sender": {
+                "username": contact.username,
+                "avatar": contact.avatar,
+            },
+            "unread_count": self.unread_count,
+        }
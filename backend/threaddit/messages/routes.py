@@ -1,8 +1,8 @@
 from threaddit.messages.models import Messages
 from flask import Blueprint, jsonify, request
 from threaddit import db
-from sqlalchemy import and_
 from threaddit.users.models import User
+from threaddit.events.broker import broker
 from flask_login import login_required, current_user
 
 messages = Blueprint("messages", __name__, url_prefix="/api")
@@ -20,7 +20,9 @@ def new_message():
             )
             db.session.add(new_message)
             db.session.commit()
-            return jsonify(new_message.as_dict()), 200
+            message = new_message.as_dict()
+            broker.publish(f"user:{new_message.receiver_id}", "message", message)
+            return jsonify(message), 200
         return jsonify({"message": "User not found"}), 404
     return jsonify({"message": "Content is required"}), 400
 
@@ -28,22 +30,27 @@ def new_message():
 @messages.route("/messages/inbox")
 @login_required
 def get_inbox():
-    return jsonify(Messages.get_inbox(current_user.id)), 200
+    limit = min(max(request.args.get("limit", default=20, type=int), 1), 100)
+    cursor = request.args.get("cursor", default=None, type=int)
+    inbox = Messages.get_inbox(current_user.id, limit, cursor)
+    response = jsonify(inbox)
+    if inbox and len(inbox) == limit:
+        response.headers["X-Next-Cursor"] = str(inbox[-1]["message_id"])
+    return response, 200
 
 
 @messages.route("/messages/all/<user_name>")
 @login_required
 def get_messages(user_name):
+    limit = min(max(request.args.get("limit", default=50, type=int), 1), 200)
+    cursor = request.args.get("cursor", default=None, type=int)
     user_id = User.query.filter_by(username=user_name).first()
     if user_id:
-        messages = Messages.query.filter(
-            and_(Messages.receiver_id == user_id.id, Messages.sender_id == current_user.id)
-            | and_(Messages.sender_id == user_id.id, Messages.receiver_id == current_user.id)
-        ).order_by(Messages.created_at)
-        for m in messages:
-            if m.receiver_id == current_user.id and m.seen == False:
-                m.seen = True
-                m.seen_at = db.func.now()
-        db.session.commit()
-        return jsonify([m.as_dict() for m in messages.all()]), 200
+        if not cursor:
+            Messages.mark_seen(current_user.id, user_id.id)
+        messages = Messages.get_conversation(current_user.id, user_id.id, limit, cursor)
+        response = jsonify([m.as_dict() for m in messages])
+        if messages and len(messages) == limit:
+            response.headers["X-Next-Cursor"] = str(messages[0].id)
+        return response, 200
     return jsonify({"message": "User not found"}), 404
@@ -0,0 +1,130 @@
+import re
+from collections import Counter as StatementCounter
+from threading import Lock
+from time import perf_counter
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+WHITESPACE = re.compile(r"\s+")
+SELECT_LIST = re.compile(r"^SELECT .+? FROM ", re.IGNORECASE)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, description, buckets, label="endpoint"):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.label = label
+        self._lock = Lock()
+        self._series = {}
+
+    def observe(self, label, value):
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = {"buckets": [0] * len(self.buckets), "sum": 0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    labels = format_labels([(self.label, label), ("le", format_value(bound))])
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = format_labels([(self.label, label), ("le", "+Inf")])
+                lines.append(f"{self.name}_bucket{labels} {series['count']}")
+                labels = format_labels([(self.label, label)])
+                lines.append(f"{self.name}_sum{labels} {format_value(series['sum'])}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, description, labels=("endpoint",)):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._lock = Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(zip(self.labels, label_values))} {format_value(value)}")
+        return lines
+
+
+def render_values(name, description, kind, value):
+    return [f"# HELP {name} {description}", f"# TYPE {name} {kind}", f"{name} {format_value(value)}"]
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0
+        self.statements = StatementCounter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+
+    def repeated(self, threshold):
+        return [
+            (SELECT_LIST.sub("SELECT ... FROM ", WHITESPACE.sub(" ", statement).strip(), count=1)[:200], count)
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def end_query(conn, cursor, statement, parameters, context, executemany):
+    seconds = perf_counter() - conn.info.pop("query_start", perf_counter())
+    if has_request_context() and "query_stats" in g:
+        g.query_stats.record(statement, seconds)
+
+
+queries = Histogram("threaddit_request_queries", "SQL statements executed per request.", QUERY_BUCKETS)
+db_seconds = Histogram("threaddit_request_db_seconds", "Time spent in SQL statements per request.", TIME_BUCKETS)
+serialize_seconds = Histogram(
+    "threaddit_request_serialize_seconds", "Time spent encoding JSON responses per request.", TIME_BUCKETS
+)
+request_seconds = Histogram("threaddit_request_seconds", "Time spent handling each request.", TIME_BUCKETS)
+repeated_statements = Counter(
+    "threaddit_repeated_statements_total",
+    "Requests that ran the same SQL statement at least METRICS_REPEAT_THRESHOLD times.",
+    labels=("endpoint", "statement"),
+)
+over_budget = Counter("threaddit_query_budget_exceeded_total", "Requests that ran more than METRICS_QUERY_BUDGET statements.")
@@ -0,0 +1,80 @@
+import hmac
+from time import perf_counter
+from flask import Blueprint, Response, g, jsonify, request
+from threaddit import app
+from threaddit.cache import response_cache
+from threaddit.metrics.registry import (
+    QueryStats,
+    db_seconds,
+    over_budget,
+    queries,
+    render_values,
+    repeated_statements,
+    request_seconds,
+    serialize_seconds,
+)
+
+metrics = Blueprint("metrics", __name__)
+
+
+@metrics.before_app_request
+def start_request():
+    g.request_start = perf_counter()
+    g.query_stats = QueryStats()
+
+
+@metrics.after_app_request
+def record_request(response):
+    stats = g.pop("query_stats", None)
+    if stats is None:
+        return response
+    endpoint = request.endpoint or "none"
+    queries.observe(endpoint, stats.count)
+    db_seconds.observe(endpoint, stats.seconds)
+    serialize_seconds.observe(endpoint, g.get("serialize_seconds", 0))
+    request_seconds.observe(endpoint, perf_counter() - g.request_start)
+    repeated = stats.repeated(app.config["METRICS_REPEAT_THRESHOLD"])
+    for statement, _ in repeated:
+        repeated_statements.inc(endpoint, statement)
+    budget = app.config["METRICS_QUERY_BUDGET"]
+    if budget and stats.count > budget:
+        over_budget.inc(endpoint)
+        app.logger.warning(
+            "%s %s ran %d queries (budget %d) in %.1f ms%s",
+            request.method,
+            request.path,
+            stats.count,
+            budget,
+            stats.seconds * 1000,
+            "".join(f"\n  {count}x {statement}" for statement, count in repeated),
+        )
+    return response
+
+
+@metrics.route("/metrics", methods=["GET"])
+def get_metrics():
+    token = app.config["METRICS_TOKEN"]
+    if not token:
+        return jsonify({"message": "Not found"}), 404
+    if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()):
+        return jsonify({"message": "Unauthorized"}), 401
+    lines = []
+    for metric in (queries, db_seconds, serialize_seconds, request_seconds, repeated_statements, over_budget):
+        lines.extend(metric.render())
+    cache_stats = response_cache.stats()
+    lines.extend(render_values("threaddit_response_cache_hits_total", "Response cache hits.", "counter", cache_stats["hits"]))
+    lines.extend(
+        render_values("threaddit_response_cache_misses_total", "Response cache misses.", "counter", cache_stats["misses"])
+    )
+    lines.extend(
+        render_values(
+            "threaddit_response_cache_invalidations_total",
+            "Response cache invalidations.",
+            "counter",
+            cache_stats["invalidations"],
+        )
+    )
+    lines.extend(
+        render_values("threaddit_response_cache_hit_ratio", "Response cache hit ratio.", "gauge", cache_stats["hit_ratio"])
+    )
+    return Response("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4; charset=utf-8")
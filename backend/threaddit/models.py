@@ -1,4 +1,5 @@
 from threaddit import db
+from threaddit.cache import response_cache
 from flask import jsonify
 
 
@@ -34,6 +35,13 @@ class UserRole(db.Model):
         new_mod = UserRole(user_id=user_id, subthread_id=subthread_id, role_id=1)
         db.session.add(new_mod)
         db.session.commit()
+        response_cache.invalidate("threads")
+
+    @classmethod
+    def delete_mod(cls, user_id, subthread_id):
+        UserRole.query.filter_by(user_id=user_id, subthread_id=subthread_id).delete()
+        db.session.commit()
+        response_cache.invalidate("threads")
 
     def as_dict(self):
         return {
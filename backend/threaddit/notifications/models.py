@@ -0,0 +1,85 @@
+from sqlalchemy.orm import joinedload
+from threaddit import app, db
+from threaddit.posts.models import Posts
+from threaddit.users.models import User
+
+
+class Notification(db.Model):
+    __tablename__ = "notifications"
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    kind = db.Column(db.Text, nullable=False)
+    actor_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"))
+    comment_id = db.Column(db.Integer, db.ForeignKey("comments.id"))
+    seen = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False, default=db.func.now())
+    actor = db.relationship("User", foreign_keys=[actor_id])
+    post = db.relationship("Posts")
+
+    @classmethod
+    def fan_out(cls, recipients, actor_id, post_id=None, comment_id=None):
+        recipients = [(user_id, kind) for user_id, kind in recipients if user_id and user_id != actor_id]
+        if not recipients:
+            return
+        db.session.execute(
+            db.text("SELECT notify_users(:users, :kinds, :actor, :post, :comment, :cap)"),
+            {
+                "users": [user_id for user_id, _ in recipients],
+                "kinds": [kind for _, kind in recipients],
+                "actor": actor_id,
+                "post": post_id,
+                "comment": comment_id,
+                "cap": app.config["NOTIFICATIONS_LIMIT"],
+            },
+        )
+
+    @classmethod
+    def get_page(cls, user_id, limit=20, cursor=None):
+        query = cls.query.filter(cls.user_id == user_id).options(
+            joinedload(cls.actor).load_only(User.username, User.avatar),
+            joinedload(cls.post).load_only(Posts.title),
+        )
+        if cursor:
+            query = query.filter(cls.id < cursor)
+        return query.order_by(cls.id.desc()).limit(limit).all()
+
+    @classmethod
+    def mark_seen(cls, user_id, up_to=None):
+        query = cls.query.filter(cls.user_id == user_id, cls.seen == False)
+        if up_to:
+            query = query.filter(cls.id <= up_to)
+        seen = query.update({"seen": True}, synchronize_session=False)
+        if seen:
+            NotificationCounter.query.filter_by(user_id=user_id).update(
+                {"unread_notifications": db.func.greatest(NotificationCounter.unread_notifications - seen, 0)},
+                synchronize_session=False,
+            )
+        db.session.commit()
+        return seen
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "seen": self.seen,
+            "created_at": self.created_at,
+            "actor": {"username": self.actor.username, "avatar": self.actor.avatar} if self.actor else None,
+            "post": {"id": self.post.id, "title": self.post.title} if self.post else None,
+            "comment_id": self.comment_id,
+        }
+
+
+class NotificationCounter(db.Model):
+    __tablename__ = "notification_counters"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0)
+    unread_messages = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def get_counts(cls, user_id):
+        counts = db.session.query(cls.unread_notifications, cls.unread_messages).filter_by(user_id=user_id).first()
+        return {
+            "notifications": counts.unread_notifications if counts else 0,
+            "messages": counts.unread_messages if counts else 0,
+        }
@@ -0,0 +1,33 @@
+from flask import Blueprint, jsonify, request
+from flask_login import current_user, login_required
+from threaddit.notifications.models import Notification, NotificationCounter
+
+notifications = Blueprint("notifications", __name__, url_prefix="/api")
+
+
+@notifications.route("/notifications/unread", methods=["GET"])
+@login_required
+def get_unread_counts():
+    return jsonify(NotificationCounter.get_counts(current_user.id)), 200
+
+
+@notifications.route("/notifications", methods=["GET"])
+@login_required
+def get_notifications():
+    limit = min(max(request.args.get("limit", default=20, type=int), 1), 100)
+    cursor = request.args.get("cursor", default=None, type=int)
+    page = Notification.get_page(current_user.id, limit, cursor)
+    response = jsonify([n.as_dict() for n in page])
+    if page and len(page) == limit:
+        response.headers["X-Next-Cursor"] = str(page[-1].id)
+    return response, 200
+
+
+@notifications.route("/notifications/seen", methods=["POST"])
+@login_required
+def mark_notifications_seen():
+    up_to = (request.get_json(silent=True) or {}).get("up_to")
+    if up_to is not None and type(up_to) is not int:
+        return jsonify({"message": "Invalid Request"}), 400
+    seen = Notification.mark_seen(current_user.id, up_to)
+    return jsonify({"message": "Notifications marked as seen", "seen": seen}), 200
@@ -0,0 +1,46 @@
+from threaddit import app, db
+from threaddit.cache import feed_cache
+from threaddit.posts.models import PostInfo, get_filters, get_sort_column, with_window
+from threaddit.subthreads.models import Subscription, SubthreadInfo
+
+FEEDS = ("home", "all", "popular")
+
+
+def get_feed_threads(feed_name, user_id=None):
+    match feed_name:
+        case "home":
+            return [s.subthread_id for s in Subscription.query.filter_by(user_id=user_id)]
+        case "all":
+            return [t.id for t in SubthreadInfo.query.order_by(SubthreadInfo.members_count.desc()).limit(25)]
+        case "popular":
+            return [t.id for t in SubthreadInfo.query.order_by(SubthreadInfo.posts_count.desc()).limit(25)]
+        case _:
+            raise Exception("Invalid Feed Request")
+
+
+def get_ranked_feed(feed_name, sortby, duration, user_id=None):
+    key = f"{feed_name}:{sortby}:{duration}:{user_id if feed_name == 'home' else ''}"
+    ranked = feed_cache.get(key)
+    if ranked is None:
+        sortBy, durationBy = get_filters(sortby=sortby, duration=duration)
+        query = db.session.query(get_sort_column(sortby, duration), PostInfo.post_id)
+        ranked = [
+            tuple(row)
+            for row in with_window(query, sortby, duration)
+            .filter(PostInfo.thread_id.in_(get_feed_threads(feed_name, user_id)))
+            .filter(durationBy)
+            .order_by(sortBy, PostInfo.post_id.desc())
+            .limit(app.config["FEED_CACHE_DEPTH"])
+        ]
+        feed_cache.set(key, ranked)
+    return ranked
+
+
+def get_feed_page(ranked, limit, offset=0, cursor=None):
+    if cursor:
+        offset = next((i + 1 for i, (_, post_id) in enumerate(ranked) if post_id == cursor[1]), None)
+        if offset is None:
+            return None
+    if offset + limit > len(ranked) >= app.config["FEED_CACHE_DEPTH"]:
+        return None
+    return ranked[offset : offset + limit]
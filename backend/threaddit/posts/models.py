@@ -1,14 +1,16 @@
 from marshmallow import validate
-from threaddit import db, ma, app
-import uuid
+from threaddit import db, ma
+import json
+import base64
 from flask import url_for
 from datetime import datetime, timedelta
-import cloudinary.uploader as uploader
-from werkzeug.utils import secure_filename
 from threaddit.subthreads.models import Subthread
 from flask_marshmallow.fields import fields
 from marshmallow.exceptions import ValidationError
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from threaddit.reactions.models import Reactions
+from threaddit.cache import feed_cache, response_cache
+from threaddit.media.jobs import enqueue_upload, enqueue_destroy, supersede_uploads
 
 
 class Posts(db.Model):
@@ -18,9 +20,19 @@ class Posts(db.Model):
     subthread_id = db.Column(db.Integer, db.ForeignKey("subthreads.id"))
     title = db.Column(db.Text, nullable=False)
     media = db.Column(db.Text)
+    media_state = db.Column(db.Text)
     is_edited = db.Column(db.Boolean, default=False)
     content = db.Column(db.Text)
     created_at = db.Column(db.DateTime(timezone=True), nullable=False, default=db.func.now())
+    search_vector = db.deferred(
+        db.Column(
+            TSVECTOR,
+            db.Computed(
+                "setweight(to_tsvector('english', title), 'A') "
+                "|| setweight(to_tsvector('english', COALESCE(content, '')), 'B')"
+            ),
+        )
+    )
     user = db.relationship("User", back_populates="post")
     subthread = db.relationship("Subthread", back_populates="post")
     post_info = db.relationship("PostInfo", back_populates="post")
@@ -30,8 +42,8 @@ class Posts(db.Model):
     saved_post = db.relationship("SavedPosts", back_populates="post")
 
     def get_media(self):
-        if self.media and not self.media.startswith("http"):
-            return url_for("send_image", filename=self.media)
+        if self.media and not self.media.startswith(("http", "/")):
+            return url_for("media.send_image", filename=self.media)
         return self.media
 
     def patch(self, form_data, image):
@@ -40,6 +52,7 @@ class Posts(db.Model):
         self.handle_media(form_data.get("content_type"), image, form_data.get("content_url"))
         self.is_edited = True
         db.session.commit()
+        response_cache.invalidate("posts", f"post:{self.id}")
 
     @classmethod
     def add(cls, form_data, image, user_id):
@@ -48,33 +61,29 @@ class Posts(db.Model):
             subthread_id=form_data.get("subthread_id"),
             title=form_data.get("title"),
         )
-        new_post.handle_media(form_data.get("content_type"), image, form_data.get("content_url"))
         if form_data.get("content"):
             new_post.content = form_data.get("content")
         db.session.add(new_post)
+        db.session.flush()
+        new_post.handle_media(form_data.get("content_type"), image, form_data.get("content_url"))
         db.session.commit()
+        feed_cache.clear()
+        response_cache.invalidate("posts", "threads")
 
     def handle_media(self, content_type, image=None, url=None):
         if content_type == "media" and image:
             self.delete_media()
-            url = None
-            filename = secure_filename(image.filename)
-            if image.content_type.startswith("image/"):
-                image_data = uploader.upload(
-                    image,
-                    public_id=f"{uuid.uuid4().hex}_{filename.rsplit('.')[0]}",
-                )
-                url = f"https://res.cloudinary.com/{app.config['CLOUDINARY_NAME']}/image/upload/c_auto,g_auto/{image_data.get('public_id')}"
-            elif image.content_type.startswith("video/"):
-                video_data = uploader.upload(
-                    image,
-                    resource_type="video",
-                    public_id=f"{uuid.uuid4().hex}_{filename.rsplit('.')[0]}",
-                )
-                url = video_data.get("playback_url")
-            self.media = url
+            self.media = None
+            self.media_state = None
+            if image.content_type.startswith(("image/", "video/")):
+                enqueue_upload("posts", self.id, image, transformation="c_auto,g_auto")
+                self.media_state = "processing"
+            else:
+                supersede_uploads("posts", self.id)
         elif content_type == "url" and url:
+            supersede_uploads("posts", self.id)
             self.media = url
+            self.media_state = None
 
     def __init__(self, user_id, subthread_id, title, media=None, content=None):
         self.user_id = user_id
@@ -84,9 +93,7 @@ class Posts(db.Model):
         self.content = content
 
     def delete_media(self):
-        if self.media and self.media.startswith(f"https://res.cloudinary.com/{app.config['CLOUDINARY_NAME']}"):
-            res = uploader.destroy(self.media.split("/")[-1])
-            print(f"Cloudinary Image Destory Response for {self.title}: ", res)
+        enqueue_destroy(self.media)
 
     def as_dict(self):
         return {
@@ -96,6 +103,7 @@ class Posts(db.Model):
             "subthread_id": self.subthread_id,
             "title": self.title,
             "media": self.get_media(),
+            "media_state": self.media_state,
             "content": self.content,
             "created_at": self.created_at,
         }
@@ -124,6 +132,7 @@ class PostInfo(db.Model):
     title = db.Column(db.Text)
     is_edited = db.Column(db.Boolean, default=False)
     media = db.Column(db.Text)
+    media_state = db.Column(db.Text)
     content = db.Column(db.Text)
     created_at = db.Column(db.DateTime(timezone=True))
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
@@ -131,39 +140,102 @@ class PostInfo(db.Model):
     user_avatar = db.Column(db.Text)
     post_karma = db.Column(db.Integer)
     comments_count = db.Column(db.Integer)
+    hot_score = db.Column(db.Float)
     post = db.relationship("Posts", back_populates="post_info")
     subthread = db.relationship("Subthread", back_populates="post_info")
     user = db.relationship("User", back_populates="post_info")
 
-    def as_dict(self, cur_user=None):
-        p_info = {
-            "user_info": {
-                "user_name": self.user_name,
-                "user_avatar": self.user_avatar,
-            },
-            "thread_info": {
-                "thread_id": self.thread_id,
-                "thread_name": self.thread_name,
-                "thread_logo": self.thread_logo,
-            },
-            "post_info": {
-                "id": self.post_id,
-                "title": self.title,
-                "media": self.media,
-                "is_edited": self.is_edited,
-                "content": self.content,
-                "created_at": self.created_at,
-                "post_karma": self.post_karma,
-                "comments_count": self.comments_count,
-            },
+    @classmethod
+    def rows(cls, query):
+        return query.with_entities(*cls.__table__.columns).all()
+
+    @classmethod
+    def get_row(cls, post_id):
+        return cls.query.filter_by(post_id=post_id).with_entities(*cls.__table__.columns).first()
+
+    @classmethod
+    def get_by_ids(cls, post_ids):
+        post_infos = {p.post_id: p for p in cls.rows(cls.query.filter(cls.post_id.in_(post_ids)))}
+        return [post_infos[post_id] for post_id in post_ids if post_id in post_infos]
+
+    @classmethod
+    def list_as_dict(cls, post_infos, cur_user=None):
+        viewer_state = get_viewer_state([p.post_id for p in post_infos], cur_user) if cur_user else None
+        return [serialize_post(p, viewer_state) for p in post_infos]
+
+    def as_dict(self, cur_user=None, viewer_state=None):
+        if cur_user and viewer_state is None:
+            viewer_state = get_viewer_state([self.post_id], cur_user)
+        return serialize_post(self, viewer_state)
+
+
+def serialize_post(p, viewer_state=None):
+    p_info = {
+        "user_info": {
+            "user_name": p.user_name,
+            "user_avatar": p.user_avatar,
+        },
+        "thread_info": {
+            "thread_id": p.thread_id,
+            "thread_name": p.thread_name,
+            "thread_logo": p.thread_logo,
+        },
+        "post_info": {
+            "id": p.post_id,
+            "title": p.title,
+            "media": p.media,
+            "media_state": p.media_state,
+            "is_edited": p.is_edited,
+            "content": p.content,
+            "created_at": p.created_at,
+            "post_karma": p.post_karma,
+            "comments_count": p.comments_count,
+        },
+    }
+    if viewer_state:
+        reactions, saved = viewer_state
+        p_info["current_user"] = {
+            "has_upvoted": reactions.get(p.post_id),
+            "saved": p.post_id in saved,
         }
-        if cur_user:
-            has_reaction = Reactions.query.filter_by(post_id=self.post_id, user_id=cur_user).first()
-            p_info["current_user"] = {
-                "has_upvoted": has_reaction.is_upvote if has_reaction else None,
-                "saved": bool(SavedPosts.query.filter_by(user_id=cur_user, post_id=self.post_id).first()),
-            }
-        return p_info
+    return p_info
+
+
+def get_viewer_state(post_ids, user_id):
+    if not post_ids:
+        return {}, set()
+    reactions = dict(
+        db.session.query(Reactions.post_id, Reactions.is_upvote).filter(
+            Reactions.user_id == user_id, Reactions.post_id.in_(post_ids)
+        )
+    )
+    saved = {
+        post_id
+        for (post_id,) in db.session.query(SavedPosts.post_id).filter(
+            SavedPosts.user_id == user_id, SavedPosts.post_id.in_(post_ids)
+        )
+    }
+    return reactions, saved
+
+
+class PostStats(db.Model):
+    __tablename__ = "post_stats"
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), primary_key=True)
+    revision = db.Column(db.BigInteger, nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    @classmethod
+    def get_stamp(cls, post_id):
+        return cls.query.with_entities(cls.revision, cls.updated_at).filter_by(post_id=post_id).first()
+
+
+class PostWindow(db.Model):
+    __tablename__ = "post_windows"
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), primary_key=True)
+    duration = db.Column(db.Text, primary_key=True)
+    subthread_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime(timezone=True))
+    karma = db.Column(db.Integer)
 
 
 def doesSubthreadExist(subthread_id):
@@ -180,28 +252,69 @@ class PostValidator(ma.SQLAlchemySchema):
     content = fields.Str(required=False)
 
 
-def get_filters(sortby, duration):
-    sortBy, durationBy = None, None
+def is_windowed(sortby, duration):
+    return sortby == "top" and duration in ("day", "week", "month", "year")
+
+
+def with_window(query, sortby, duration):
+    if is_windowed(sortby, duration):
+        return query.join(PostWindow, PostWindow.post_id == PostInfo.post_id).filter(PostWindow.duration == duration)
+    return query
+
+
+def get_sort_column(sortby, duration="alltime"):
     match sortby:
         case "top":
-            sortBy = PostInfo.post_karma.desc()
+            return PostWindow.karma if is_windowed(sortby, duration) else PostInfo.post_karma
         case "new":
-            sortBy = PostInfo.created_at.desc()
+            return PostInfo.created_at
         case "hot":
-            sortBy = PostInfo.comments_count.desc()
+            return PostInfo.hot_score
         case _:
             raise Exception("Invalid Sortby Request")
+
+
+def get_filters(sortby, duration):
+    sortBy, durationBy = get_sort_column(sortby, duration).desc(), None
+    created_at = PostWindow.created_at if is_windowed(sortby, duration) else PostInfo.created_at
     match duration:
         case "day":
-            durationBy = PostInfo.created_at.between(datetime.now() - timedelta(days=1), datetime.now())
+            durationBy = created_at.between(datetime.now() - timedelta(days=1), datetime.now())
         case "week":
-            durationBy = PostInfo.created_at.between(datetime.now() - timedelta(days=7), datetime.now())
+            durationBy = created_at.between(datetime.now() - timedelta(days=7), datetime.now())
         case "month":
-            durationBy = PostInfo.created_at.between(datetime.now() - timedelta(days=30), datetime.now())
+            durationBy = created_at.between(datetime.now() - timedelta(days=30), datetime.now())
         case "year":
-            durationBy = PostInfo.created_at.between(datetime.now() - timedelta(days=365), datetime.now())
+            durationBy = created_at.between(datetime.now() - timedelta(days=365), datetime.now())
         case "alltime":
             durationBy = True
         case _:
             raise Exception("Invalid Duration Request")
     return sortBy, durationBy
+
+
+def encode_cursor(sortby, value, post_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sortby, value, post_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(sortby, cursor):
+    try:
+        cursor_sortby, value, post_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if sortby == "new":
+            value = datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        raise Exception("Invalid Cursor")
+    if cursor_sortby != sortby or not is_number(post_id, int) or not (sortby == "new" or is_number(value)):
+        raise Exception("Invalid Cursor")
+    return value, post_id
+
+
+def is_number(value, kind=(int, float)):
+    return isinstance(value, kind) and not isinstance(value, bool)
+
+
+def get_cursor_filter(sortby, cursor, duration="alltime"):
+    return db.tuple_(get_sort_column(sortby, duration), PostInfo.post_id) < decode_cursor(sortby, cursor)
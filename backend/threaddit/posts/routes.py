@@ -6,49 +6,80 @@ from threaddit.posts.models import (
     Posts,
     PostValidator,
     get_filters,
+    get_sort_column,
+    get_cursor_filter,
+    with_window,
+    encode_cursor,
+    decode_cursor,
     SavedPosts,
+    PostStats,
+    serialize_post,
 )
-from threaddit.subthreads.models import Subscription, SubthreadInfo
+from threaddit.posts.feeds import FEEDS, get_feed_threads, get_ranked_feed, get_feed_page
+from threaddit.cache import feed_cache, response_cache
+from threaddit.conditional import conditional
+from threaddit.reactions.models import ReactionRevision
 
 posts = Blueprint("posts", __name__, url_prefix="/api")
 
 
-@posts.route("/posts/<feed_name>", methods=["GET"])
-def get_posts(feed_name):
-    limit = request.args.get("limit", default=20, type=int)
-    offset = request.args.get("offset", default=0, type=int)
-    sortby = request.args.get("sortby", default="top", type=str)
-    duration = request.args.get("duration", default="alltime", type=str)
+def get_page_args():
+    return (
+        max(request.args.get("limit", default=20, type=int), 1),
+        max(request.args.get("offset", default=0, type=int), 0),
+        request.args.get("sortby", default="top", type=str),
+        request.args.get("duration", default="alltime", type=str),
+        request.args.get("cursor", default=None, type=str),
+    )
+
+
+def get_post_page(query):
+    limit, offset, sortby, duration, cursor = get_page_args()
     try:
         sortBy, durationBy = get_filters(sortby=sortby, duration=duration)
+        query = with_window(query, sortby, duration)
+        if cursor:
+            query, offset = query.filter(get_cursor_filter(sortby, cursor, duration)), 0
     except Exception:
         return jsonify({"message": "Invalid Request"}), 400
-    if feed_name == "home" and current_user.is_authenticated:
-        threads = [subscription.subthread.id for subscription in Subscription.query.filter_by(user_id=current_user.id)]
-    elif feed_name == "all":
-        threads = (thread.id for thread in SubthreadInfo.query.order_by(SubthreadInfo.members_count.desc()).limit(25))
-    elif feed_name == "popular":
-        threads = (thread.id for thread in SubthreadInfo.query.order_by(SubthreadInfo.posts_count.desc()).limit(25))
-    else:
+    page = PostInfo.rows(
+        query.filter(durationBy).order_by(sortBy, PostInfo.post_id.desc()).limit(limit).offset(offset)
+    )
+    response = jsonify(PostInfo.list_as_dict(page, current_user.id if current_user.is_authenticated else None))
+    if page and len(page) == limit:
+        sort_value = getattr(page[-1], get_sort_column(sortby).key)
+        response.headers["X-Next-Cursor"] = encode_cursor(sortby, sort_value, page[-1].post_id)
+    return response, 200
+
+
+@posts.route("/posts/<feed_name>", methods=["GET"])
+@response_cache.cached("posts")
+def get_posts(feed_name):
+    if feed_name not in FEEDS or (feed_name == "home" and not current_user.is_authenticated):
+        return jsonify({"message": "Invalid Request"}), 400
+    limit, offset, sortby, duration, cursor = get_page_args()
+    user_id = current_user.id if current_user.is_authenticated else None
+    try:
+        get_filters(sortby=sortby, duration=duration)
+        cursor = decode_cursor(sortby, cursor) if cursor else None
+    except Exception:
         return jsonify({"message": "Invalid Request"}), 400
-    post_list = [
-        pinfo.as_dict(cur_user=current_user.id if current_user.is_authenticated else None)
-        for pinfo in PostInfo.query.filter(PostInfo.thread_id.in_(threads))
-        .order_by(sortBy)
-        .filter(durationBy)
-        .limit(limit)
-        .offset(offset)
-        .all()
-    ]
-    return jsonify(post_list), 200
+    page = get_feed_page(get_ranked_feed(feed_name, sortby, duration, user_id), limit, offset, cursor)
+    if page is None:
+        return get_post_page(PostInfo.query.filter(PostInfo.thread_id.in_(get_feed_threads(feed_name, user_id))))
+    response = jsonify(PostInfo.list_as_dict(PostInfo.get_by_ids([post_id for _, post_id in page]), user_id))
+    if len(page) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(sortby, *page[-1])
+    return response, 200
 
 
 @posts.route("/post/<pid>", methods=["GET"])
+@conditional(PostStats.get_stamp, ReactionRevision.get_revision)
 def get_post(pid):
-    post_info = PostInfo.query.filter_by(post_id=pid).first()
+    post_info = PostInfo.get_row(pid)
     if post_info:
         return (
-            jsonify({"post": post_info.as_dict()}),
+            jsonify({"post": serialize_post(post_info)}),
             200,
         )
     return jsonify({"message": "Invalid Post"}), 400
@@ -109,69 +140,38 @@ def delete_post(pid):
         post.delete_media()
         Posts.query.filter_by(id=pid).delete()
         db.session.commit()
+        feed_cache.clear()
+        response_cache.invalidate("posts", "threads", f"post:{post.id}")
         return jsonify({"message": "Post deleted"}), 200
-    current_user_mod_in = [r.subthread_id for r in current_user.user_role if r.role.slug == "mod"]
-    if post.subthread_id in current_user_mod_in:
+    if current_user.moderates(post.subthread_id):
         post.delete_media()
         Posts.query.filter_by(id=pid).delete()
         db.session.commit()
+        feed_cache.clear()
+        response_cache.invalidate("posts", "threads", f"post:{post.id}")
         return jsonify({"message": "Post deleted"}), 200
     return jsonify({"message": "Unauthorized"}), 401
 
 
 @posts.route("/posts/thread/<tid>", methods=["GET"])
 def get_posts_of_thread(tid):
-    limit = request.args.get("limit", default=20, type=int)
-    offset = request.args.get("offset", default=0, type=int)
-    sortby = request.args.get("sortby", default="top", type=str)
-    duration = request.args.get("duration", default="alltime", type=str)
-    try:
-        sortBy, durationBy = get_filters(sortby=sortby, duration=duration)
-    except Exception:
-        return jsonify({"message": "Invalid Request"}), 400
-    post_list = [
-        pinfo.as_dict(current_user.id if current_user.is_authenticated else None)
-        for pinfo in PostInfo.query.filter(PostInfo.thread_id == tid)
-        .order_by(sortBy)
-        .filter(durationBy)
-        .limit(limit)
-        .offset(offset)
-        .all()
-    ]
-    return jsonify(post_list), 200
+    return get_post_page(PostInfo.query.filter(PostInfo.thread_id == tid))
 
 
 @posts.route("/posts/user/<user_name>", methods=["GET"])
 def get_posts_of_user(user_name):
-    limit = request.args.get("limit", default=20, type=int)
-    offset = request.args.get("offset", default=0, type=int)
-    sortby = request.args.get("sortby", default="top", type=str)
-    duration = request.args.get("duration", default="alltime", type=str)
-    try:
-        sortBy, durationBy = get_filters(sortby=sortby, duration=duration)
-    except Exception:
-        return jsonify({"message": "Invalid Request"}), 400
-    post_list = [
-        pinfo.as_dict(current_user.id if current_user.is_authenticated else None)
-        for pinfo in PostInfo.query.filter(PostInfo.user_name == user_name)
-        .order_by(sortBy)
-        .filter(durationBy)
-        .limit(limit)
-        .offset(offset)
-        .all()
-    ]
-    return jsonify(post_list), 200
+    return get_post_page(PostInfo.query.filter(PostInfo.user_name == user_name))
 
 
 @posts.route("/posts/saved", methods=["GET"])
 @login_required
 def get_saved():
-    limit = request.args.get("limit", default=20, type=int)
-    offset = request.args.get("offset", default=0, type=int)
+    limit = max(request.args.get("limit", default=20, type=int), 1)
+    offset = max(request.args.get("offset", default=0, type=int), 0)
     saved_posts = SavedPosts.query.filter(SavedPosts.user_id == current_user.id).offset(offset).limit(limit).all()
-    post_infos = [PostInfo.query.filter_by(post_id=pid.post_id) for pid in saved_posts]
+    post_infos = PostInfo.get_by_ids([saved.post_id for saved in saved_posts])
     return (
-        jsonify([p.first().as_dict(current_user.id) for p in post_infos]),
+        jsonify(PostInfo.list_as_dict(post_infos, current_user.id)),
         200,
     )
 
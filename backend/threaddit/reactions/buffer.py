@@ -0,0 +1,54 @@
+import atexit
+from threading import Event, Lock, Thread
+from threaddit import app, db
+from threaddit.cache import response_cache
+
+
+def flush_karma():
+    post_ids = set(db.session.execute(db.text("SELECT * FROM flush_karma_deltas()")).scalars())
+    db.session.commit()
+    if post_ids:
+        # feed pages are left to expire on RESPONSE_CACHE_TTL, or steady voting would keep them from ever being cached
+        response_cache.invalidate(*(f"post:{post_id}" for post_id in post_ids))
+    return post_ids
+
+
+class KarmaFlusher:
+    def __init__(self, interval):
+        self.interval = interval
+        self._started = False
+        self._lock = Lock()
+        self._stop = Event()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            Thread(target=self.run, daemon=True).start()
+            atexit.register(self.stop)
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        with app.app_context():
+            try:
+                flush_karma()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception("Karma flush failed")
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+    def notify(self):
+        if self.interval:
+            self.start()
+        else:
+            self.flush()
+
+
+karma_flusher = KarmaFlusher(app.config["KARMA_FLUSH_INTERVAL"] / 1000)
@@ -1,4 +1,6 @@
+from sqlalchemy.dialects.postgresql import insert
 from threaddit import db
+from threaddit.reactions.buffer import karma_flusher
 
 
 class Reactions(db.Model):
@@ -20,14 +22,35 @@ class Reactions(db.Model):
         self.is_upvote = is_upvote
 
     @classmethod
-    def add(cls, user_id, is_upvote, post_id=None, comment_id=None):
-        new_reaction = Reactions(user_id=user_id, is_upvote=is_upvote, post_id=post_id, comment_id=comment_id)
-        db.session.add(new_reaction)
-        db.session.commit()
+    def apply(cls, user_id, votes, column):
+        target = getattr(cls, column)
+        upserts = [
+            {"user_id": user_id, column: target_id, "is_upvote": is_upvote}
+            for target_id, is_upvote in sorted(votes.items())
+            if is_upvote is not None
+        ]
+        removals = [target_id for target_id, is_upvote in votes.items() if is_upvote is None]
+        changed = set()
+        if upserts:
+            stmt = insert(cls).values(upserts)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["user_id", column],
+                set_={"is_upvote": stmt.excluded.is_upvote},
+                where=cls.is_upvote.is_distinct_from(stmt.excluded.is_upvote),
+            ).returning(target)
+            changed.update(db.session.execute(stmt).scalars())
+        if removals:
+            stmt = db.delete(cls).where(cls.user_id == user_id, target.in_(removals)).returning(target)
+            changed.update(db.session.execute(stmt).scalars())
+        return changed
 
-    def patch(self, is_upvote):
-        self.is_upvote = is_upvote
+    @classmethod
+    def apply_batch(cls, user_id, post_votes, comment_votes):
+        posts = cls.apply(user_id, post_votes, "post_id")
+        comments = cls.apply(user_id, comment_votes, "comment_id")
         db.session.commit()
+        karma_flusher.notify()
+        return posts, comments
 
     def as_dict(self):
         return {
@@ -38,3 +61,13 @@ class Reactions(db.Model):
             "is_upvote": self.is_upvote,
             "created_at": self.created_at,
         }
+
+
+class ReactionRevision(db.Model):
+    __tablename__ = "reaction_revisions"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    revision = db.Column(db.BigInteger, nullable=False, default=0)
+
+    @classmethod
+    def get_revision(cls, user_id):
+        return db.session.query(cls.revision).filter_by(user_id=user_id).scalar() or 0
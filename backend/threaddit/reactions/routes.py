@@ -1,71 +1,91 @@
 from flask import Blueprint, jsonify, request
+from sqlalchemy.exc import IntegrityError
 from threaddit import db
 from threaddit.reactions.models import Reactions
 from flask_login import current_user, login_required
 
 reactions = Blueprint("reactions", __name__, url_prefix="/api")
 
+MAX_BATCH_SIZE = 100
 
-@reactions.route("/reactions/post/<post_id>", methods=["PATCH"])
-@login_required
-def update_reaction_post(post_id):
-    if request.json:
-        update_reaction = Reactions.query.filter_by(post_id=post_id, user_id=current_user.id).first()
-        if update_reaction:
-            update_reaction.is_upvote = request.json.get("is_upvote")
-            db.session.commit()
-            return jsonify({"message": "Reaction updated"}), 200
-    return jsonify({"message": "Invalid Reaction"}), 400
+
+class InvalidReaction(Exception):
+    pass
+
+
+def parse_votes(items):
+    if items is None:
+        return {}
+    if not isinstance(items, list):
+        raise InvalidReaction("Invalid Reaction")
+    votes = {}
+    for item in items:
+        if not isinstance(item, dict) or "is_upvote" not in item:
+            raise InvalidReaction("Invalid Reaction")
+        target_id, is_upvote = item.get("id"), item.get("is_upvote")
+        if type(target_id) is not int or not (is_upvote is None or isinstance(is_upvote, bool)):
+            raise InvalidReaction("Invalid Reaction")
+        votes[target_id] = is_upvote
+    return votes
+
+
+def apply_votes(post_votes, comment_votes):
+    try:
+        return Reactions.apply_batch(current_user.id, post_votes, comment_votes)
+    except IntegrityError:
+        db.session.rollback()
+        raise InvalidReaction("Invalid Reaction")
 
 
-@reactions.route("/reactions/post/<post_id>", methods=["PUT"])
+@reactions.route("/reactions", methods=["POST"])
 @login_required
-def add_reaction_post(post_id):
-    if request.json:
-        has_upvoted = request.json.get("is_upvote")
-        Reactions.add(user_id=current_user.id, is_upvote=has_upvoted, post_id=post_id)
-        return jsonify({"message": "Reaction added"}), 200
-    return jsonify({"message": "Invalid Reaction"}), 400
+def batch_reactions():
+    if not isinstance(request.json, dict):
+        return jsonify({"message": "Invalid Reaction"}), 400
+    try:
+        post_votes = parse_votes(request.json.get("posts"))
+        comment_votes = parse_votes(request.json.get("comments"))
+        if len(post_votes) + len(comment_votes) > MAX_BATCH_SIZE:
+            raise InvalidReaction(f"At most {MAX_BATCH_SIZE} reactions per request")
+        posts, comments = apply_votes(post_votes, comment_votes)
+    except InvalidReaction as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify({"posts": sorted(posts), "comments": sorted(comments)}), 200
 
 
-@reactions.route("/reactions/post/<post_id>", methods=["DELETE"])
+@reactions.route("/reactions/post/<int:post_id>", methods=["PUT", "PATCH"])
 @login_required
-def delete_reaction_post(post_id):
-    reaction = Reactions.query.filter_by(post_id=post_id, user_id=current_user.id).first()
-    if reaction:
-        Reactions.query.filter_by(post_id=post_id, user_id=current_user.id).delete()
-        db.session.commit()
-        return jsonify({"message": "Reaction deleted"}), 200
+def update_reaction_post(post_id):
+    if request.json and isinstance(request.json.get("is_upvote"), bool):
+        try:
+            apply_votes({post_id: request.json.get("is_upvote")}, {})
+        except InvalidReaction as e:
+            return jsonify({"message": str(e)}), 400
+        return jsonify({"message": "Reaction updated"}), 200
     return jsonify({"message": "Invalid Reaction"}), 400
 
 
-@reactions.route("/reactions/comment/<comment_id>", methods=["PATCH"])
+@reactions.route("/reactions/post/<int:post_id>", methods=["DELETE"])
 @login_required
-def update_reaction_comment(comment_id):
-    if request.json:
-        has_upvoted = request.json.get("is_upvote")
-        reaction = Reactions.query.filter_by(comment_id=comment_id, user_id=current_user.id).first()
-        if reaction:
-            reaction.patch(has_upvoted)
-            return jsonify({"message": "Reaction updated"}), 200
-    return jsonify({"message": "Invalid Reaction"}), 400
+def delete_reaction_post(post_id):
+    apply_votes({post_id: None}, {})
+    return jsonify({"message": "Reaction deleted"}), 200
 
 
-@reactions.route("/reactions/comment/<comment_id>", methods=["PUT"])
+@reactions.route("/reactions/comment/<int:comment_id>", methods=["PUT", "PATCH"])
 @login_required
-def add_reaction_comment(comment_id):
-    if request.json:
-        Reactions.add(user_id=current_user.id, is_upvote=request.json.get("is_upvote"), comment_id=comment_id)
-        return jsonify({"message": "Reaction added"}), 200
+def update_reaction_comment(comment_id):
+    if request.json and isinstance(request.json.get("is_upvote"), bool):
+        try:
+            apply_votes({}, {comment_id: request.json.get("is_upvote")})
+        except InvalidReaction as e:
+            return jsonify({"message": str(e)}), 400
+        return jsonify({"message": "Reaction updated"}), 200
     return jsonify({"message": "Invalid Reaction"}), 400
 
 
-@reactions.route("/reactions/comment/<comment_id>", methods=["DELETE"])
+@reactions.route("/reactions/comment/<int:comment_id>", methods=["DELETE"])
 @login_required
 def delete_reaction_comment(comment_id):
-    reaction = Reactions.query.filter_by(comment_id=comment_id, user_id=current_user.id).first()
-    if reaction:
-        Reactions.query.filter_by(comment_id=comment_id, user_id=current_user.id).delete()
-        db.session.commit()
-        return jsonify({"message": "Reaction deleted"}), 200
-    return jsonify({"message": "Invalid Reaction"}), 400
+    apply_votes({}, {comment_id: None})
+    return jsonify({"message": "Reaction deleted"}), 200
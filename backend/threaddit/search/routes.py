@@ -0,0 +1,50 @@
+from flask import Blueprint, jsonify, request
+from flask_login import current_user
+from threaddit.comments.models import CommentInfo, get_comment_reactions, serialize_comment
+from threaddit.posts.models import PostInfo
+from threaddit.search.utils import SEARCH_TYPES, search_ids
+from threaddit.search.typeahead import user_index, thread_index
+from threaddit.subthreads.models import SubthreadInfo
+
+search = Blueprint("search", __name__, url_prefix="/api")
+
+
+@search.route("/search", methods=["GET"])
+def get_search():
+    query = request.args.get("q", default="", type=str).strip()
+    search_type = request.args.get("type", default=None, type=str)
+    limit = min(max(request.args.get("limit", default=20, type=int), 1), 100)
+    offset = max(request.args.get("offset", default=0, type=int), 0)
+    if not query or (search_type and search_type not in SEARCH_TYPES):
+        return jsonify({"message": "Invalid Request"}), 400
+    cur_user = current_user.id if current_user.is_authenticated else None
+    results = {}
+    for result_type in [search_type] if search_type else SEARCH_TYPES:
+        ids = search_ids(result_type, query, limit=limit, offset=offset)
+        match result_type:
+            case "posts":
+                results["posts"] = PostInfo.list_as_dict(PostInfo.get_by_ids(ids), cur_user)
+            case "comments":
+                rows = CommentInfo.rows(CommentInfo.query.filter(CommentInfo.comment_id.in_(ids)))
+                comments = {c.comment_id: c for c in rows}
+                reactions = get_comment_reactions(ids, cur_user) if cur_user else None
+                results["comments"] = [
+                    {"post_id": comments[cid].post_id, "comment": serialize_comment(comments[cid], reactions)}
+                    for cid in ids
+                    if cid in comments
+                ]
+            case "threads":
+                threads = {t.id: t for t in SubthreadInfo.query.filter(SubthreadInfo.id.in_(ids))}
+                results["threads"] = [threads[tid].as_dict() for tid in ids if tid in threads]
+    return jsonify(results), 200
+
+
+@search.route("/autocomplete", methods=["GET"])
+def get_autocomplete():
+    prefix = request.args.get("q", default="", type=str).strip()
+    search_type = request.args.get("type", default="threads", type=str)
+    limit = min(max(request.args.get("limit", default=10, type=int), 1), 25)
+    index = {"users": user_index, "threads": thread_index}.get(search_type)
+    if not prefix or index is None:
+        return jsonify({"message": "Invalid Request"}), 400
+    return jsonify(index.search(prefix, limit)), 200
@@ -0,0 +1,89 @@
+import time
+from bisect import bisect_left, insort
+from threading import Lock, Thread
+from threaddit import app
+from threaddit.subthreads.models import Subthread
+from threaddit.users.models import User
+
+
+def normalize(name):
+    name = name.lower()
+    return name[2:] if name.startswith("t/") else name
+
+
+class PrefixIndex:
+    def __init__(self, loader, ttl=300):
+        self.loader = loader
+        self.ttl = ttl
+        self._keys = []
+        self._payloads = {}
+        self._loaded_at = None
+        self._refreshing = False
+        self._lock = Lock()
+
+    def refresh(self):
+        payloads = {normalize(name): payload for name, payload in self.loader()}
+        with self._lock:
+            self._keys = sorted(payloads)
+            self._payloads = payloads
+            self._loaded_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        with app.app_context():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+
+    def _ensure_fresh(self):
+        if self._loaded_at is None:
+            self.refresh()
+        elif time.monotonic() - self._loaded_at > self.ttl and not self._refreshing:
+            self._refreshing = True
+            Thread(target=self._refresh_in_background, daemon=True).start()
+
+    def add(self, name, payload):
+        key = normalize(name)
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            if key not in self._payloads:
+                insort(self._keys, key)
+            self._payloads[key] = payload
+
+    def remove(self, name):
+        key = normalize(name)
+        with self._lock:
+            if self._payloads.pop(key, None) is not None:
+                self._keys.pop(bisect_left(self._keys, key))
+
+    def search(self, prefix, limit=10):
+        self._ensure_fresh()
+        prefix = normalize(prefix)
+        keys, payloads = self._keys, self._payloads
+        start = bisect_left(keys, prefix)
+        results = []
+        for key in keys[start : start + limit]:
+            if not key.startswith(prefix):
+                break
+            if (payload := payloads.get(key)) is not None:
+                results.append(payload)
+        return results
+
+
+def load_users():
+    return (
+        (username, {"username": username, "avatar": avatar})
+        for username, avatar in User.query.with_entities(User.username, User.avatar)
+    )
+
+
+def load_threads():
+    return (
+        (name, {"id": thread_id, "name": name, "logo": logo})
+        for thread_id, name, logo in Subthread.query.with_entities(Subthread.id, Subthread.name, Subthread.logo)
+    )
+
+
+user_index = PrefixIndex(load_users, ttl=app.config["TYPEAHEAD_TTL"])
+thread_index = PrefixIndex(load_threads, ttl=app.config["TYPEAHEAD_TTL"])
@@ -0,0 +1,41 @@
+from sqlalchemy import func
+from threaddit import db
+from threaddit.comments.models import Comments
+from threaddit.posts.models import Posts
+from threaddit.subthreads.models import Subthread
+
+SEARCH_TYPES = {
+    "posts": (Posts, "english"),
+    "comments": (Comments, "english"),
+    "threads": (Subthread, "simple"),
+}
+
+
+def search_ids(search_type, search, limit=20, offset=0):
+    model, config = SEARCH_TYPES[search_type]
+    query = func.websearch_to_tsquery(config, search)
+    return [
+        row_id
+        for (row_id,) in db.session.query(model.id)
+        .filter(model.search_vector.op("@@")(query))
+        .order_by(func.ts_rank_cd(model.search_vector, query).desc(), model.id.desc())
+        .limit(limit)
+        .offset(offset)
+    ]
+
+
+def ilike_ids(search_type, search, limit=20, offset=0):
+    model, _ = SEARCH_TYPES[search_type]
+    columns = {
+        "posts": (Posts.title, Posts.content),
+        "comments": (Comments.content,),
+        "threads": (Subthread.name, Subthread.description),
+    }[search_type]
+    return [
+        row_id
+        for (row_id,) in db.session.query(model.id)
+        .filter(db.or_(*(column.ilike(f"%{search}%") for column in columns)))
+        .order_by(model.id.desc())
+        .limit(limit)
+        .offset(offset)
+    ]
@@ -0,0 +1,98 @@
+import codecs
+import json
+import math
+import re
+from datetime import date, datetime, time, timezone
+from time import perf_counter
+from flask import g, has_request_context
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+COMPACT = {"separators": (",", ":")}
+EXPONENT = re.compile(rb"e[-\d]")
+
+
+def http_date(value):
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time(), tzinfo=timezone.utc)
+    elif value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    elif value.tzinfo is not timezone.utc:
+        value = value.astimezone(timezone.utc)
+    return (
+        f"{DAYS[value.weekday()]}, {value.day:02d} {MONTHS[value.month - 1]} {value.year:04d} "
+        f"{value.hour:02d}:{value.minute:02d}:{value.second:02d} GMT"
+    )
+
+
+def default(o):
+    if isinstance(o, date):
+        return http_date(o)
+    return _default(o)
+
+
+def escape_non_ascii(error):
+    return json.dumps(error.object[error.start : error.end])[1:-1], error.end
+
+
+codecs.register_error("threaddit.json_escape", escape_non_ascii)
+
+
+def has_float_mismatch(data):
+    # orjson writes floats like 1e16 and 0.00001 where json writes 1e+16 and 1e-05
+    if b"0.0000" in data:
+        return True
+    return any(data[m.start() - 1 : m.start()].isdigit() for m in EXPONENT.finditer(data))
+
+
+def finite(o):
+    if isinstance(o, float):
+        return o if math.isfinite(o) else None
+    if isinstance(o, dict):
+        return {k: finite(v) for k, v in o.items()}
+    if isinstance(o, (list, tuple)):
+        return [finite(v) for v in o]
+    return o
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    default = staticmethod(default)
+    orjson_options = (
+        (orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+    )
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs != COMPACT or not self.sort_keys or not self.ensure_ascii:
+            return self.json_dumps(obj, **kwargs)
+        try:
+            data = orjson.dumps(obj, default=self.default, option=self.orjson_options)
+        except TypeError:
+            return self.json_dumps(obj, **kwargs)
+        if has_float_mismatch(data):
+            return self.json_dumps(obj, **kwargs)
+        if not data.isascii():
+            data = data.decode().encode("ascii", "threaddit.json_escape")
+        return data.decode().replace("\x7f", "\\u007f")
+
+    def json_dumps(self, obj, **kwargs):
+        # orjson writes NaN and Infinity as null; json would write bare NaN, which JSON.parse rejects
+        try:
+            return super().dumps(obj, **{**kwargs, "allow_nan": False})
+        except ValueError as e:
+            if "Out of range float" not in str(e):
+                raise
+            return super().dumps(finite(obj), **kwargs)
+
+    def response(self, *args, **kwargs):
+        start = perf_counter()
+        try:
+            return super().response(*args, **kwargs)
+        finally:
+            if has_request_context():
+                g.serialize_seconds = g.get("serialize_seconds", 0) + perf_counter() - start
@@ -1,6 +1,8 @@
-from threaddit import db, app
-import cloudinary.uploader as uploader
-import uuid
+from threaddit import db
+from threaddit.models import Role, UserRole
+from threaddit.users.models import User
+from threaddit.media.jobs import enqueue_upload, enqueue_destroy, supersede_uploads
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 
 class Subthread(db.Model):
@@ -11,6 +13,15 @@ class Subthread(db.Model):
     created_at = db.Column(db.DateTime(timezone=True), nullable=False, default=db.func.now())
     logo = db.Column(db.Text)
     created_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    search_vector = db.deferred(
+        db.Column(
+            TSVECTOR,
+            db.Computed(
+                "setweight(to_tsvector('simple', replace(name, '/', ' ')), 'A') "
+                "|| setweight(to_tsvector('simple', COALESCE(description, '')), 'B')"
+            ),
+        )
+    )
     user = db.relationship("User", back_populates="subthread")
     user_role = db.relationship("UserRole", back_populates="subthread")
     subscription = db.relationship("Subscription", back_populates="subthread")
@@ -26,8 +37,9 @@ class Subthread(db.Model):
             description=form_data.get("description"),
             created_by=created_by,
         )
-        new_sub.handle_logo(form_data.get("content_type"), image, form_data.get("content_url"))
         db.session.add(new_sub)
+        db.session.flush()
+        new_sub.handle_logo(form_data.get("content_type"), image, form_data.get("content_url"))
         db.session.commit()
         return new_sub
 
@@ -39,35 +51,37 @@ class Subthread(db.Model):
 
     def handle_logo(self, content_type, image=None, url=None):
         if content_type == "image" and image:
-            self.delete_logo()
-            image_data = uploader.upload(image, public_id=f"{uuid.uuid4().hex}_{image.filename.rsplit('.')[0]}")
-            url = f"https://res.cloudinary.com/{app.config['CLOUDINARY_NAME']}/image/upload/f_auto,q_auto/{image_data.get('public_id')}"
-            self.logo = url
+            enqueue_upload("subthreads", self.id, image, transformation="f_auto,q_auto")
         elif content_type == "url" and url:
+            supersede_uploads("subthreads", self.id)
+            self.delete_logo()
             self.logo = url
 
     def delete_logo(self):
-        if self.logo and self.logo.startswith(f"https://res.cloudinary.com/{app.config['CLOUDINARY_NAME']}"):
-            res = uploader.destroy(self.logo.split("/")[-1])
-            print(f"Cloudinary Image Destory Response for {self.name}: ", res)
+        enqueue_destroy(self.logo)
+
+    @classmethod
+    def list_as_dict(cls, threads, cur_user_id=None):
+        thread_state = get_thread_state(threads, cur_user_id)
+        return [t.as_dict(cur_user_id, thread_state) for t in threads]
 
-    def as_dict(self, cur_user_id=None):
+    def as_dict(self, cur_user_id=None, thread_state=None):
+        stats, creators, mods, subscribed = thread_state or get_thread_state([self], cur_user_id)
+        thread_stats = stats.get(self.id)
         data = {
             "id": self.id,
             "name": self.name,
             "description": self.description,
             "created_at": self.created_at,
             "logo": self.logo,
-            "PostsCount": len(self.post),
-            "CommentsCount": sum([len(p.comment) for p in self.post]),
-            "created_by": self.user.username if self.user else None,
-            "subscriberCount": len(self.subscription),
-            "modList": [r.user.username for r in self.user_role if r.role.slug == "mod"],
+            "PostsCount": thread_stats.posts_count if thread_stats else 0,
+            "CommentsCount": thread_stats.comments_count if thread_stats else 0,
+            "created_by": creators.get(self.created_by),
+            "subscriberCount": thread_stats.members_count if thread_stats else 0,
+            "modList": mods.get(self.id, []),
         }
         if cur_user_id:
-            data["has_subscribed"] = bool(
-                Subscription.query.filter_by(user_id=cur_user_id, subthread_id=self.id).first()
-            )
+            data["has_subscribed"] = self.id in subscribed
         return data
 
     def __init__(self, name, created_by, description=None, logo=None):
@@ -96,6 +110,25 @@ class Subscription(db.Model):
         self.subthread_id = subthread_id
 
 
+class SubthreadStats(db.Model):
+    __tablename__ = "subthread_stats"
+    subthread_id = db.Column(db.Integer, db.ForeignKey("subthreads.id"), primary_key=True)
+    members_count = db.Column(db.Integer, nullable=False)
+    posts_count = db.Column(db.Integer, nullable=False)
+    comments_count = db.Column(db.Integer, nullable=False)
+    revision = db.Column(db.BigInteger, nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    @classmethod
+    def get_stamp(cls, thread_name):
+        return (
+            db.session.query(cls.revision, cls.updated_at)
+            .join(Subthread, Subthread.id == cls.subthread_id)
+            .filter(Subthread.name == f"t/{thread_name}")
+            .first()
+        )
+
+
 class SubthreadInfo(db.Model):
     __tablename__ = "subthread_info"
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -115,3 +148,31 @@ class SubthreadInfo(db.Model):
             "PostsCount": self.posts_count or 0,
             "CommentsCount": self.comments_count or 0,
         }
+
+
+def get_thread_state(threads, cur_user_id=None):
+    thread_ids = [t.id for t in threads]
+    if not thread_ids:
+        return {}, {}, {}, set()
+    stats = {s.subthread_id: s for s in SubthreadStats.query.filter(SubthreadStats.subthread_id.in_(thread_ids))}
+    creators = dict(
+        db.session.query(User.id, User.username).filter(User.id.in_({t.created_by for t in threads if t.created_by}))
+    )
+    mods = {}
+    for subthread_id, username in (
+        db.session.query(UserRole.subthread_id, User.username)
+        .join(User, User.id == UserRole.user_id)
+        .join(Role, Role.id == UserRole.role_id)
+        .filter(Role.slug == "mod", UserRole.subthread_id.in_(thread_ids))
+        .order_by(UserRole.id)
+    ):
+        mods.setdefault(subthread_id, []).append(username)
+    subscribed = set()
+    if cur_user_id:
+        subscribed = {
+            subthread_id
+            for (subthread_id,) in db.session.query(Subscription.subthread_id).filter(
+                Subscription.user_id == cur_user_id, Subscription.subthread_id.in_(thread_ids)
+            )
+        }
+    return stats, creators, mods, subscribed
@@ -1,4 +1,4 @@
-from threaddit.subthreads.models import Subthread, SubthreadInfo, Subscription
+from threaddit.subthreads.models import Subthread, SubthreadInfo, Subscription, SubthreadStats
 from flask_login import current_user, login_required
 import re
 from threaddit.users.models import User
@@ -6,22 +6,31 @@ from flask import Blueprint, jsonify, request
 from threaddit.models import UserRole
 from threaddit import db
 from threaddit.auth.decorators import auth_role
+from threaddit.cache import feed_cache, response_cache
+from threaddit.search.typeahead import thread_index
+from threaddit.conditional import conditional
 
 threads = Blueprint("threads", __name__, url_prefix="/api")
 thread_name_regex = re.compile(r"^\w{3,}$")
 
 
 @threads.route("/threads", methods=["GET"])
+@response_cache.cached("threads")
 def get_subthreads():
-    limit = request.args.get("limit", default=10, type=int)
-    offset = request.args.get("offset", default=0, type=int)
+    limit = max(request.args.get("limit", default=10, type=int), 1)
+    offset = max(request.args.get("offset", default=0, type=int), 0)
     cur_user = current_user.id if current_user.is_authenticated else None
     subscribed_threads = []
     if current_user.is_authenticated:
-        subscribed_threads = [
-            subscription.subthread.as_dict(cur_user)
-            for subscription in Subscription.query.filter_by(user_id=current_user.id).limit(limit).offset(offset).all()
-        ]
+        subscribed_threads = Subthread.list_as_dict(
+            Subthread.query.join(Subscription, Subscription.subthread_id == Subthread.id)
+            .filter(Subscription.user_id == current_user.id)
+            .order_by(Subscription.id)
+            .limit(limit)
+            .offset(offset)
+            .all(),
+            cur_user,
+        )
     all_threads = [
         subinfo.as_dict()
         for subinfo in SubthreadInfo.query.filter(SubthreadInfo.members_count.is_not(None))
@@ -63,10 +72,12 @@ def subthread_search():
 @threads.route("/threads/get/all")
 def get_all_thread():
     threads = Subthread.query.order_by(Subthread.name).all()
-    return jsonify([t.as_dict() for t in threads]), 200
+    return jsonify(Subthread.list_as_dict(threads)), 200
 
 
 @threads.route("/threads/<thread_name>")
+@conditional(SubthreadStats.get_stamp)
+@response_cache.cached("threads")
 def get_thread_by_name(thread_name):
     thread_info = SubthreadInfo.query.filter_by(name=f"t/{thread_name}").first()
     subthread = Subthread.query.filter_by(name=f"t/{thread_name}").first()
@@ -87,6 +98,8 @@ def get_thread_by_name(thread_name):
 @login_required
 def new_subscription(tid):
     Subscription.add(tid, current_user.id)
+    feed_cache.clear()
+    response_cache.invalidate("threads")
     return jsonify({"message": "Subscribed"}), 200
 
 
@@ -97,6 +110,8 @@ def del_subscription(tid):
     if subscription:
         Subscription.query.filter_by(user_id=current_user.id, subthread_id=tid).delete()
         db.session.commit()
+        feed_cache.clear()
+        response_cache.invalidate("threads")
     else:
         return jsonify({"message": "Invalid Subscription"}), 400
     return jsonify({"message": "UnSubscribed"}), 200
@@ -112,6 +127,8 @@ def new_thread():
     subthread = Subthread.add(form_data, image, current_user.id)
     if subthread:
         UserRole.add_moderator(current_user.id, subthread.id)
+        response_cache.invalidate("threads")
+        thread_index.add(subthread.name, {"id": subthread.id, "name": subthread.name, "logo": subthread.logo})
         return jsonify({"message": "Thread created"}), 200
     return jsonify({"message": "Something went wrong"}), 500
 
@@ -126,6 +143,8 @@ def update_thread(tid):
     image = request.files.get("media")
     form_data = request.form.to_dict()
     thread.patch(form_data, image)
+    response_cache.invalidate("threads", "posts")
+    thread_index.add(thread.name, {"id": thread.id, "name": thread.name, "logo": thread.logo})
     return (
         jsonify(
             {
@@ -157,7 +176,6 @@ def delete_mod(tid, username):
     if user and thread:
         if thread.created_by == user.id and not current_user.has_role("admin"):
             return jsonify({"message": "Cannot Remove Thread Creator"}), 400
-        UserRole.query.filter_by(user_id=user.id, subthread_id=tid).delete()
-        db.session.commit()
+        UserRole.delete_mod(user.id, tid)
         return jsonify({"message": "Moderator deleted"}), 200
     return jsonify({"message": "Invalid User"}), 400
@@ -1,16 +1,53 @@
 from sqlalchemy import func
-import cloudinary.uploader as uploader
-import uuid
 from threaddit import db, login_manager, app
 from flask_login import UserMixin
 from threaddit import ma, app
 from flask_marshmallow.fields import fields
 from marshmallow.exceptions import ValidationError
+from threaddit.cache import auth_cache
+from threaddit.models import Role, UserRole
+from threaddit.media.jobs import enqueue_upload, enqueue_destroy, supersede_uploads
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(user_id)
+    row = (
+        db.session.query(User, UserStats.revision)
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+        .filter(User.id == int(user_id))
+        .first()
+    )
+    if row is None:
+        return None
+    user, revision = row
+    user._principal = get_principal(user.id, revision)
+    return user
+
+
+def make_principal(role_rows):
+    roles, mod_in = set(), set()
+    for slug, subthread_id in role_rows:
+        roles.add(slug)
+        if slug == "mod":
+            mod_in.add(subthread_id)
+    return {"roles": sorted(roles), "mod_in": sorted(mod_in)}
+
+
+def get_principal(user_id, revision=None):
+    if revision is None:
+        revision = db.session.query(UserStats.revision).filter_by(user_id=user_id).scalar()
+    # the user_roles trigger bumps user_stats.revision, so a role change is a new key in every worker
+    key = f"principal:{user_id}:{revision}"
+    principal = auth_cache.get(key) if revision is not None else None
+    if principal is None:
+        principal = make_principal(
+            db.session.query(Role.slug, UserRole.subthread_id)
+            .join(Role, Role.id == UserRole.role_id)
+            .filter(UserRole.user_id == user_id)
+        )
+        if revision is not None:
+            auth_cache.set(key, principal)
+    return principal
 
 
 class User(db.Model, UserMixin):
@@ -48,22 +85,28 @@ class User(db.Model, UserMixin):
 
     def patch(self, image, form_data):
         if form_data.get("content_type") == "image" and image:
-            self.delete_avatar()
-            image_data = uploader.upload(image, public_id=f"{uuid.uuid4().hex}_{image.filename.rsplit('.')[0]}")
-            url = f"https://res.cloudinary.com/{app.config['CLOUDINARY_NAME']}/image/upload/f_auto,q_auto/{image_data.get('public_id')}"
-            self.avatar = url
+            enqueue_upload("users", self.id, image, transformation="f_auto,q_auto")
         elif form_data.get("content_type") == "url":
+            supersede_uploads("users", self.id)
+            self.delete_avatar()
             self.avatar = form_data.get("content_url")
         self.bio = form_data.get("bio")
         db.session.commit()
 
     def delete_avatar(self):
-        if self.avatar and self.avatar.startswith(f"https://res.cloudinary.com/{app.config['CLOUDINARY_NAME']}"):
-            res = uploader.destroy(self.avatar.split("/")[-1])
-            print(f"Cloudinary Image Destory Response for {self.username}: ", res)
+        enqueue_destroy(self.avatar)
+
+    @property
+    def principal(self):
+        if self.__dict__.get("_principal") is None:
+            self._principal = get_principal(self.id)
+        return self._principal
 
     def has_role(self, role):
-        return role in {r.role.slug for r in self.user_role}
+        return role in self.principal["roles"]
+
+    def moderates(self, subthread_id):
+        return subthread_id in self.principal["mod_in"]
 
     @classmethod
     def get_all(cls):
@@ -79,9 +122,9 @@ class User(db.Model, UserMixin):
                 "avatar": self.avatar,
                 "bio": self.bio,
                 "registrationDate": self.registration_date,
-                "roles": list({r.role.slug for r in self.user_role}),
+                "roles": self.principal["roles"],
                 "karma": self.user_karma[0].as_dict(),
-                "mod_in": [r.subthread_id for r in self.user_role if r.role.slug == "mod"],
+                "mod_in": self.principal["mod_in"],
             }
             if not include_all
             else {"id": self.id, "email": self.email, **self.as_dict()}
@@ -126,6 +169,22 @@ class UserRegisterValidator(ma.SQLAlchemySchema):
     password = fields.Str(required=True, validate=[fields.validate.Length(min=8)])
 
 
+class UserStats(db.Model):
+    __tablename__ = "user_stats"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    revision = db.Column(db.BigInteger, nullable=False)
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False)
+
+    @classmethod
+    def get_stamp(cls, username):
+        return (
+            db.session.query(cls.revision, cls.updated_at)
+            .join(User, User.id == cls.user_id)
+            .filter(User.username == username)
+            .first()
+        )
+
+
 class UsersKarma(db.Model):
     __tablename__: str = "user_info"
     user_id: int = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, primary_key=True)
@@ -4,8 +4,11 @@ from threaddit.users.models import (
     UserLoginValidator,
     UserRegisterValidator,
     User,
+    UserStats,
 )
 from threaddit.auth.decorators import auth_role
+from threaddit.search.typeahead import user_index
+from threaddit.conditional import conditional
 from bcrypt import hashpw, checkpw, gensalt
 from flask_login import login_user, logout_user, current_user, login_required
 
@@ -44,6 +47,7 @@ def user_register():
             hashpw(register_form.get("password").encode(), gensalt()).decode("utf-8"),
         )
         new_user.add()
+        user_index.add(new_user.username, {"username": new_user.username, "avatar": new_user.avatar})
         return jsonify(new_user.as_dict()), 201
     return jsonify({"message": "Invalid credentials"}), 401
 
@@ -54,6 +58,7 @@ def user_patch():
     image = request.files.get("avatar")
     form_data = request.form.to_dict()
     current_user.patch(image=image, form_data=form_data)
+    user_index.add(current_user.username, {"username": current_user.username, "avatar": current_user.avatar})
     return jsonify(current_user.as_dict()), 200
 
 
@@ -61,6 +66,7 @@ def user_patch():
 @login_required
 def user_delete():
     current_user.delete_avatar()
+    user_index.remove(current_user.username)
     User.query.filter_by(id=current_user.id).delete()
     logout_user()
     db.session.commit()
@@ -74,6 +80,7 @@ def user_get():
 
 
 @user.route("/user/<user_name>", methods=["GET"])
+@conditional(UserStats.get_stamp)
 def user_get_by_username(user_name):
     user = User.query.filter_by(username=user_name).first()
     if user: